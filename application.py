@@ -1,38 +1,67 @@
 import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_jwt import JWT
 from flask_restful import Api
 from dotenv import load_dotenv
+from passwords import PasswordHasher
+from pool import InstrumentedQueuePool
+from routing import RoutingSQLAlchemy
+from instrumentation import init_instrumentation
+from compression import init_compression
 
 load_dotenv()
 
 app = Flask(__name__)
 app.config.from_object(os.environ['APP_SETTINGS'])
 api = Api(app)
-db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
+db = RoutingSQLAlchemy(app, engine_options={'poolclass': InstrumentedQueuePool})
+hasher = PasswordHasher(app)
+init_instrumentation(app)
+init_compression(app)
 
 import models
+from serializers import init_json
 from auth import authenticate, identity
 
+init_json(app)
+
 jwt = JWT(app, authenticate, identity)
 
-from controllers.runs import RunList, RunDetail, CommentsList, CommentDetail, IntervalList, IntervalDetail
-from controllers.users import Register, UserList, UserDetail, UserRuns, Profile
+from controllers.runs import RunList, RunImport, RunDetail, CommentsList, CommentDetail, IntervalList, IntervalBatch, IntervalDetail
+from controllers.users import Register, UserList, UserSearch, UserDetail, UserRuns, UserStats, UserRecords, Profile, ProfileExport
+from controllers.metrics import Metrics, CacheMetrics, PoolMetrics
+from controllers.search import Search
+from controllers.feed import Feed, UserFollow
+from controllers.jobs import JobList, JobDetail
+from controllers.tracks import TrackDetail, TrackPolyline
 
 api.add_resource(Profile, '/api/profile')
+api.add_resource(ProfileExport, '/api/profile/export')
 api.add_resource(Register, '/api/register')
 api.add_resource(UserList, '/api/users')
+api.add_resource(UserSearch, '/api/users/search')
 api.add_resource(UserDetail, '/api/users/<int:user_id>')
 api.add_resource(UserRuns, '/api/users/<int:user_id>/runs')
+api.add_resource(UserStats, '/api/users/<int:user_id>/stats')
+api.add_resource(UserRecords, '/api/users/<int:user_id>/records')
+api.add_resource(UserFollow, '/api/users/<int:user_id>/follow')
 api.add_resource(RunList, '/api/runs')
+api.add_resource(RunImport, '/api/runs/import')
 api.add_resource(RunDetail, '/api/runs/<int:run_id>')
 api.add_resource(CommentsList, '/api/runs/<int:run_id>/comments')
 api.add_resource(IntervalList, '/api/runs/<int:run_id>/intervals')
+api.add_resource(IntervalBatch, '/api/runs/<int:run_id>/intervals/batch')
+api.add_resource(TrackDetail, '/api/runs/<int:run_id>/track')
+api.add_resource(TrackPolyline, '/api/runs/<int:run_id>/track/polyline')
 api.add_resource(IntervalDetail, '/api/intervals/<int:interval_id>')
 api.add_resource(CommentDetail, '/api/comments/<int:comment_id>')
+api.add_resource(Search, '/api/search')
+api.add_resource(Feed, '/api/feed')
+api.add_resource(JobList, '/api/jobs')
+api.add_resource(JobDetail, '/api/jobs/<int:job_id>')
+api.add_resource(Metrics, '/metrics')
+api.add_resource(CacheMetrics, '/api/metrics/cache')
+api.add_resource(PoolMetrics, '/api/metrics/pool')
 
 if __name__ == '__main__':
     app.run()
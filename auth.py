@@ -1,14 +1,61 @@
+from flask import g
+from flask_jwt import JWTError
+from sqlalchemy.orm import make_transient_to_detached
 import models
-from application import bcrypt
+from application import app, db, hasher
+from cache import tiered_cache
+from passwords import PasswordHasherBusy
+
+# Identities are invalidated on writes, which other workers must see, so a
+# shared tier is read directly. Without one, each process caches its own.
+identity_cache = tiered_cache(app.config, 'identity', exact=True)
+
+# What current_identity is read for: the profile and the fields handlers
+# check. Anything else, e.g. the password hash, loads on access.
+IDENTITY_COLUMNS = (
+    'id', 'first_name', 'last_name', 'email', 'is_active', 'metric',
+    'follower_count', 'run_count', 'last_run_date', 'created', 'updated'
+)
 
 def authenticate(email, password):
     user = models.User.query.filter_by(email=email).first()
     if user:
         pw_hash = user.password
-        if bcrypt.check_password_hash(pw_hash, password):
+        try:
+            valid = hasher.check(pw_hash, password)
+        except PasswordHasherBusy:
+            raise JWTError('Service Unavailable', 'Too many logins in progress', status_code=503, headers={'Retry-After': '1'})
+
+        if valid:
+            if hasher.needs_rehash(pw_hash):
+                rehash_password(user, password)
             return user
 
+def rehash_password(user, password):
+    try:
+        user.password = password
+        user.hash_password()
+        db.session.commit()
+    except:
+        db.session.rollback()
+        return
+
+    invalidate_identity(user.id)
+
 def identity(payload):
     user_id = payload['identity']
+    g.identity_id = user_id
+
+    data = identity_cache.get(user_id)
+    if data is not None:
+        user = models.User(**data)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
     user = models.User.query.filter_by(id=user_id).first()
-    return user
\ No newline at end of file
+    if user:
+        identity_cache.set(user_id, {key: getattr(user, key) for key in IDENTITY_COLUMNS})
+    return user
+
+def invalidate_identity(user_id):
+    identity_cache.delete(user_id)
@@ -0,0 +1,256 @@
+"""Throughput, latency and query counts for every GET resource in application.py.
+
+Seed data first with benchmarks.seed. Endpoints are driven either in-process
+through the Flask test client or over HTTP against a multi-worker server
+(gunicorn when installed, otherwise werkzeug with forked workers):
+
+    python -m benchmarks.api --target client --requests 500 --concurrency 8 --output before.json
+    python -m benchmarks.api --target server --workers 4 --baseline before.json --output after.json
+
+With --baseline the run exits non-zero if any endpoint errors, exceeds its
+QUERY_BUDGETS entry, issues more queries than the baseline, or has a p95
+latency more than --tolerance above the baseline.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from application import app, db, jwt
+import models
+from testing import QUERY_BUDGETS, count_queries
+from benchmarks.bcrypt_rounds import percentile
+from benchmarks.seed import bench_users
+
+QUERY_STRINGS = {
+    'usersearch': {'q': 'ada'},
+    'search': {'q': 'easy'}
+}
+
+def sample_ids():
+    """Path arguments for every route: the seeded user, a run of theirs with intervals and comments, and their job."""
+    user = bench_users().first()
+    if user is None:
+        raise SystemExit('Seed some data first, e.g. with benchmarks.seed')
+
+    interval = models.Interval.query.join(models.Run) \
+        .filter(models.Run.user_id == user.id) \
+        .filter(models.Run.run_comments.any()) \
+        .order_by(models.Interval.id) \
+        .first()
+    if interval is None:
+        raise SystemExit('Seed runs with intervals and comments, e.g. --intervals 4 --comments 2')
+
+    comment = models.RunComment.query.filter_by(run_id=interval.run_id).order_by(models.RunComment.id).first()
+    job = models.Job.query.filter_by(user_id=user.id).order_by(models.Job.id).first()
+    if job is None:
+        raise SystemExit('Seed data is from before jobs were seeded; reseed with benchmarks.seed')
+
+    return user, {
+        'user_id': user.id,
+        'run_id': interval.run_id,
+        'interval_id': interval.id,
+        'comment_id': comment.id,
+        'job_id': job.id
+    }
+
+def endpoints(ids):
+    """(endpoint, url) for every GET route registered on the app that ids has arguments for."""
+    result = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or 'GET' not in rule.methods:
+            continue
+        # Rule.build raises rather than returning None when an argument is missing.
+        if not rule.arguments <= set(ids):
+            continue
+
+        url = rule.build(ids, append_unknown=False)[1]
+        query = QUERY_STRINGS.get(rule.endpoint)
+        if query:
+            url += '?' + urlencode(query)
+        result.append((rule.endpoint, url))
+    return sorted(result)
+
+def measure_queries(client, headers, urls):
+    counts = {}
+    for endpoint, url in urls:
+        with count_queries() as counter:
+            client.get(url, headers=headers)
+        counts[endpoint] = counter.count
+    return counts
+
+def client_get(client, headers):
+    def get(url):
+        response = client.get(url, headers=headers)
+        response.get_data()
+        return response.status_code
+    return get
+
+def http_get(base_url, headers):
+    def get(url):
+        request = urllib.request.Request(base_url + url, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return get
+
+def drive(get, url, requests, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        status = get(url)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        results = list(threads.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, status in results]
+    return {
+        'requests': requests,
+        'errors': sum(1 for latency, status in results if status >= 400),
+        'requests_per_sec': requests / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(port, workers):
+    try:
+        import gunicorn
+        command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', '127.0.0.1:{}'.format(port), 'application:app']
+    except ImportError:
+        command = [sys.executable, '-m', 'benchmarks.api', '--serve', '--port', str(port), '--workers', str(workers)]
+
+    server = subprocess.Popen(command, env=os.environ.copy())
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise SystemExit('Server did not start on port {}'.format(port))
+
+def serve(port, workers):
+    from werkzeug.serving import run_simple
+    run_simple('127.0.0.1', port, app, threaded=False, processes=workers)
+
+def regressions(results, baseline, tolerance):
+    failures = []
+    for endpoint, result in sorted(results['endpoints'].items()):
+        if result['errors']:
+            failures.append('{}: {} errors'.format(endpoint, result['errors']))
+
+        budget = QUERY_BUDGETS.get(endpoint)
+        if budget is not None and result['queries'] > budget:
+            failures.append('{}: {} queries, budget is {}'.format(endpoint, result['queries'], budget))
+
+        before = (baseline or {}).get('endpoints', {}).get(endpoint)
+        if before is None:
+            continue
+
+        if result['queries'] > before['queries']:
+            failures.append('{}: {} queries, baseline had {}'.format(endpoint, result['queries'], before['queries']))
+
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            failures.append('{}: p95 {:.1f} ms, baseline {:.1f} ms'.format(endpoint, result['p95_ms'], before['p95_ms']))
+
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--target', choices=['client', 'server'], default='client')
+    parser.add_argument('--workers', type=int, default=4, help='Server worker processes')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Fail on regressions against this results file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 slowdown against the baseline')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.workers)
+        return
+
+    with app.app_context():
+        user, ids = sample_ids()
+        token = jwt.jwt_encode_callback(user).decode('utf-8')
+        urls = endpoints(ids)
+        dataset = {
+            'users': bench_users().count(),
+            'runs': models.Run.query.count(),
+            'intervals': models.Interval.query.count(),
+            'comments': models.RunComment.query.count()
+        }
+        db.session.remove()
+
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+    client = app.test_client()
+    # Counted serially in-process; this also warms up every endpoint.
+    queries = measure_queries(client, headers, urls)
+
+    server = None
+    if args.target == 'server':
+        port = args.port or free_port()
+        server = start_server(port, args.workers)
+        get = http_get('http://127.0.0.1:{}'.format(port), headers)
+    else:
+        get = client_get(client, headers)
+
+    results = {
+        'target': args.target,
+        'workers': args.workers if server else None,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'dataset': dataset,
+        'endpoints': {}
+    }
+
+    try:
+        print('{:>16} {:>10} {:>9} {:>9} {:>9} {:>8} {:>7}'.format('endpoint', 'req/sec', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'errors'))
+        for endpoint, url in urls:
+            result = drive(get, url, args.requests, args.concurrency)
+            result.update(url=url, queries=queries[endpoint])
+            results['endpoints'][endpoint] = result
+            print('{:>16} {requests_per_sec:>10.1f} {p50_ms:>9.1f} {p95_ms:>9.1f} {p99_ms:>9.1f} {queries:>8} {errors:>7}'.format(endpoint, **result))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = regressions(results, baseline, args.tolerance)
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Login throughput and latency at several bcrypt cost factors.
+
+Run from the repository root:
+
+    python -m benchmarks.bcrypt_rounds --rounds 10 12 14 --logins 200 --concurrency 16 --pool-size 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passwords import PasswordHasher, hash_password
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+def run(rounds, logins, concurrency, pool_size):
+    hasher = PasswordHasher(rounds=rounds, pool_size=pool_size, max_pending=pool_size * 4)
+    pw_hash = hash_password('correct horse battery', rounds)
+
+    def login(_):
+        start = time.perf_counter()
+        hasher.check(pw_hash, 'correct horse battery')
+        return time.perf_counter() - start
+
+    # Warm up the process pool so worker start-up is not measured.
+    hasher.check(pw_hash, 'correct horse battery')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        latencies = list(threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    hasher.shutdown()
+
+    return {
+        'rounds': rounds,
+        'logins_per_sec': logins / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, nargs='+', default=[8, 10, 12, 14])
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+
+    print('{:>6} {:>12} {:>10} {:>10}'.format('rounds', 'logins/sec', 'p50 ms', 'p99 ms'))
+    for rounds in args.rounds:
+        result = run(rounds, args.logins, args.concurrency, args.pool_size)
+        print('{rounds:>6} {logins_per_sec:>12.1f} {p50_ms:>10.1f} {p99_ms:>10.1f}'.format(**result))
+
+if __name__ == '__main__':
+    main()
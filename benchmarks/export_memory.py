@@ -0,0 +1,102 @@
+"""Peak memory of the streaming export as the number of runs grows.
+
+Seeds a throwaway user at each size and exports their history in a fresh
+process, reporting that process's peak RSS. RSS covers the buffers libpq and
+psycopg2 hold for the cursor as well as the Python heap. Exits non-zero if
+the peak grows by more than --tolerance-mb between the smallest and largest
+size:
+
+    python -m benchmarks.export_memory --sizes 1000 10000 50000 --format csv --gzip
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+from application import app, db
+import models
+import imports
+import exports
+from benchmarks.run_import import synthetic_rows, cleanup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def max_rss():
+    """Peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def seed_user(size, intervals=4):
+    user = models.User(
+        first_name='Bench',
+        last_name='Export',
+        email='bench-export-{}-{}@example.com'.format(size, int(time.time() * 1000)),
+        password='x' * 60,
+        is_active=True,
+        metric=True
+    )
+    db.session.add(user)
+    db.session.commit()
+    imports.import_runs(synthetic_rows(size, intervals), user)
+    return user
+
+def remove_user(user):
+    cleanup(user)
+    db.session.delete(user)
+    db.session.commit()
+
+def measure(user_id, export_format, compress):
+    """Consumes the export in this process and returns (peak RSS, output bytes)."""
+    with app.app_context():
+        total = 0
+        for chunk in exports.export_lines(user_id, export_format, compress):
+            total += len(chunk)
+    return max_rss(), total
+
+def export_peak(user_id, export_format, compress):
+    """(peak RSS, output bytes) of exporting a user's history in a fresh process.
+
+    ru_maxrss never goes down, so each size needs its own process for the
+    peaks to be comparable.
+    """
+    command = [sys.executable, '-m', 'benchmarks.export_memory', '--measure', str(user_id), '--format', export_format]
+    if compress:
+        command.append('--gzip')
+    output = subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    peak, total = output.split()
+    return int(peak), int(total)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--format', default='ndjson', choices=sorted(exports.EXPORT_FORMATS))
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--tolerance-mb', type=float, default=10.0)
+    parser.add_argument('--measure', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        print(*measure(args.measure, args.format, args.gzip))
+        return
+
+    peaks = []
+    print('{:>8} {:>14} {:>12}'.format('runs', 'output bytes', 'peak RSS MB'))
+    with app.app_context():
+        for size in sorted(args.sizes):
+            user = seed_user(size)
+            try:
+                peak, total = export_peak(user.id, args.format, args.gzip)
+            finally:
+                remove_user(user)
+            peaks.append(peak)
+            print('{:>8} {:>14} {:>12.2f}'.format(size, total, peak / 1e6))
+
+    growth = (peaks[-1] - peaks[0]) / 1e6
+    if growth > args.tolerance_mb:
+        print('Peak RSS grew by {:.2f} MB'.format(growth))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
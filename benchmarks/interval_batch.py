@@ -0,0 +1,92 @@
+"""Time and queries to log a track workout: one IntervalList.post per repeat
+against a single IntervalBatch.put.
+
+Uses the first seeded benchmark user (see benchmarks.seed) and a run it
+creates and removes again:
+
+    python -m benchmarks.interval_batch --intervals 20 --repeat 10
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from application import app, db, jwt
+import models
+import records
+from testing import count_queries
+from benchmarks.bcrypt_rounds import percentile
+from benchmarks.seed import bench_users
+
+def per_interval(client, headers, run_id, intervals):
+    for interval in intervals:
+        response = client.post('/api/runs/{}/intervals'.format(run_id), data=interval, headers=headers)
+        assert response.status_code == 200, response.status_code
+
+def batch(client, headers, run_id, intervals):
+    response = client.put(
+        '/api/runs/{}/intervals/batch'.format(run_id),
+        data=json.dumps({'intervals': intervals}),
+        content_type='application/json',
+        headers=headers
+    )
+    assert response.status_code == 200, response.status_code
+
+def clear(run_id):
+    with app.app_context():
+        models.PersonalRecord.query.filter_by(run_id=run_id).delete(synchronize_session=False)
+        models.Interval.query.filter_by(run_id=run_id).delete(synchronize_session=False)
+        db.session.commit()
+
+def measure(fn, client, headers, run_id, intervals, repeat):
+    times = []
+    queries = None
+    for _ in range(repeat):
+        clear(run_id)
+        with app.app_context(), count_queries() as counter:
+            start = time.perf_counter()
+            fn(client, headers, run_id, intervals)
+            times.append(time.perf_counter() - start)
+        queries = counter.count
+
+    return {'p50_ms': percentile(times, 50) * 1000, 'p95_ms': percentile(times, 95) * 1000, 'queries': queries}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--intervals', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with app.app_context():
+        user = bench_users().first()
+        if user is None:
+            raise SystemExit('Seed some data first, e.g. with benchmarks.seed')
+
+        run = models.Run(user_id=user.id, run_date=datetime.utcnow(), distance=8000, duration=2400,
+                         metric=True, run_type='intervals', location='Track')
+        db.session.add(run)
+        db.session.commit()
+        run_id, user_id = run.id, user.id
+        token = jwt.jwt_encode_callback(user).decode('utf-8')
+
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+    intervals = [{'distance': 400, 'duration': 75 + i % 5, 'metric': 'true'} for i in range(args.intervals)]
+
+    try:
+        results = [
+            ('per-interval post', measure(per_interval, client, headers, run_id, intervals, args.repeat)),
+            ('batch put', measure(batch, client, headers, run_id, intervals, args.repeat))
+        ]
+    finally:
+        clear(run_id)
+        with app.app_context():
+            models.Run.query.filter_by(id=run_id).delete(synchronize_session=False)
+            db.session.commit()
+            records.backfill(user_id)
+
+    print('{:>18} {:>9} {:>9} {:>8}'.format('path', 'p50 ms', 'p95 ms', 'queries'))
+    for name, result in results:
+        print('{:>18} {p50_ms:>9.1f} {p95_ms:>9.1f} {queries:>8}'.format(name, **result))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Response bytes and latency of RunList, CommentsList and UserRuns with and
+without field projection and compression.
+
+Uses the first seeded benchmark user (see benchmarks.seed) and one of their
+runs:
+
+    python -m benchmarks.payload --repeat 50
+"""
+import argparse
+import time
+from application import app, jwt
+import models
+from benchmarks.bcrypt_rounds import percentile
+from benchmarks.seed import bench_users
+
+VARIANTS = (
+    ('full', '', None),
+    ('projected', 'fields=run_date,distance,duration,user&fields[user]=first_name,last_name&include=', None),
+    ('full gzip', '', 'gzip'),
+    ('projected gzip', 'fields=run_date,distance,duration,user&fields[user]=first_name,last_name&include=', 'gzip'),
+    ('full br', '', 'br'),
+    ('projected br', 'fields=run_date,distance,duration,user&fields[user]=first_name,last_name&include=', 'br')
+)
+
+COMMENT_FIELDS = 'fields=comment,created&include='
+
+def measure(client, url, headers, repeat):
+    times = []
+    size = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        times.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        size = len(response.get_data())
+
+    return {'bytes': size, 'p50_ms': percentile(times, 50) * 1000, 'p95_ms': percentile(times, 95) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    with app.app_context():
+        user = bench_users().first()
+        if user is None:
+            raise SystemExit('Seed some data first, e.g. with benchmarks.seed')
+
+        run = models.Run.query.filter_by(user_id=user.id).order_by(models.Run.id).first()
+        user_id, run_id = user.id, run.id
+        token = jwt.jwt_encode_callback(user).decode('utf-8')
+        encodings = app.extensions['compression_encodings']
+
+    client = app.test_client()
+    resources = (
+        ('RunList', '/api/runs?page_size={}'.format(args.page_size), None),
+        ('CommentsList', '/api/runs/{}/comments?page_size={}'.format(run_id, args.page_size), COMMENT_FIELDS),
+        ('UserRuns', '/api/users/{}/runs?page_size={}'.format(user_id, args.page_size), None)
+    )
+
+    print('{:>13} {:>15} {:>9} {:>9} {:>9}'.format('resource', 'variant', 'bytes', 'p50 ms', 'p95 ms'))
+    for resource, url, projected_fields in resources:
+        for variant, fields, encoding in VARIANTS:
+            if encoding and encoding not in encodings:
+                continue
+
+            headers = {'Authorization': 'Bearer {}'.format(token), 'Accept-Encoding': encoding or 'identity'}
+            if fields:
+                url_fields = projected_fields or fields
+                # UserRuns serializes the user itself, so its run fields go in fields[run].
+                if resource == 'UserRuns':
+                    url_fields = url_fields.replace('fields=', 'fields[run]=', 1)
+                result = measure(client, '{}&{}'.format(url, url_fields), headers, args.repeat)
+            else:
+                result = measure(client, url, headers, args.repeat)
+
+            print('{:>13} {:>15} {bytes:>9} {p50_ms:>9.1f} {p95_ms:>9.1f}'.format(resource, variant, **result))
+
+if __name__ == '__main__':
+    main()
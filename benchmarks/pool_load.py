@@ -0,0 +1,78 @@
+"""RunList throughput under concurrent clients at several connection pool sizes.
+
+Each pool size runs in its own process (DB_POOL_SIZE is read when the
+engine is created) and drives GET /api/runs through the Flask test client
+from --concurrency threads:
+
+    python -m benchmarks.pool_load --pool-sizes 1 2 5 10 20 --concurrency 32 --requests 2000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def child(requests, concurrency):
+    from application import app, db, jwt
+    import models
+    from pool import pool_stats
+    from benchmarks.bcrypt_rounds import percentile
+
+    with app.app_context():
+        user = models.User.query.join(models.Run).first()
+        if user is None:
+            raise SystemExit('Seed some runs first, e.g. with benchmarks.run_import')
+        token = jwt.jwt_encode_callback(user).decode('utf-8')
+        db.session.remove()
+
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+
+    def get(_):
+        start = time.perf_counter()
+        response = client.get('/api/runs', headers=headers)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        latencies = list(threads.map(get, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        wait = pool_stats(db.engine)['checkout_wait']
+
+    print(json.dumps({
+        'requests_per_sec': requests / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_wait_ms': wait['sum'] / wait['count'] * 1000 if wait['count'] else 0.0,
+        'max_wait_ms': wait['max'] * 1000
+    }))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 2, 5, 10, 20])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.requests, args.concurrency)
+        return
+
+    print('{:>5} {:>10} {:>9} {:>9} {:>13} {:>12}'.format('pool', 'req/sec', 'p50 ms', 'p99 ms', 'mean wait ms', 'max wait ms'))
+    for size in args.pool_sizes:
+        env = dict(os.environ, DB_POOL_SIZE=str(size), DB_MAX_OVERFLOW='0')
+        output = subprocess.check_output([
+            sys.executable, '-m', 'benchmarks.pool_load', '--child',
+            '--requests', str(args.requests), '--concurrency', str(args.concurrency)
+        ], env=env)
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        print('{:>5} {requests_per_sec:>10.1f} {p50_ms:>9.1f} {p99_ms:>9.1f} {mean_wait_ms:>13.2f} {max_wait_ms:>12.2f}'.format(size, **result))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Rows/sec of the bulk run import against one RunList.post-style insert per run.
+
+Runs against the database configured by APP_SETTINGS/DATABASE_URL and
+removes the user and runs it creates:
+
+    python -m benchmarks.run_import --rows 5000 --intervals 4
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from application import app, db
+import models
+import stats
+import imports
+from constants import ISO_FORMAT
+
+def synthetic_rows(count, intervals):
+    start = datetime(2015, 1, 1)
+    for i in range(count):
+        yield {
+            'run_date': (start + timedelta(days=i)).strftime(ISO_FORMAT),
+            'distance': random.randint(1000, 42000),
+            'duration': random.randint(300, 14400),
+            'metric': True,
+            'run_type': random.choice(['easy', 'tempo', 'long', 'intervals']),
+            'location': 'Park',
+            'intervals': [{'distance': 400, 'duration': random.randint(60, 100)} for _ in range(intervals)]
+        }
+
+def one_at_a_time(rows, user):
+    for row in rows:
+        run, intervals, error = imports.build_run(row, user)
+        db.session.add(run)
+        stats.record_run(run)
+        db.session.commit()
+
+        for interval in intervals:
+            interval.run_id = run.id
+            db.session.add(interval)
+            db.session.commit()
+
+def cleanup(user):
+    run_ids = db.session.query(models.Run.id).filter_by(user_id=user.id)
+    models.Interval.query.filter(models.Interval.run_id.in_(run_ids.subquery())).delete(synchronize_session=False)
+    models.Run.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    models.RunSummary.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    db.session.commit()
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--intervals', type=int, default=0)
+    args = parser.parse_args()
+
+    with app.app_context():
+        user = models.User(
+            first_name='Bench',
+            last_name='Import',
+            email='bench-import-{}@example.com'.format(int(time.time())),
+            password='x' * 60,
+            is_active=True,
+            metric=True
+        )
+        db.session.add(user)
+        db.session.commit()
+
+        try:
+            single = timed(one_at_a_time, synthetic_rows(args.rows, args.intervals), user)
+            cleanup(user)
+            bulk = timed(imports.import_runs, synthetic_rows(args.rows, args.intervals), user)
+            cleanup(user)
+        finally:
+            db.session.delete(user)
+            db.session.commit()
+
+    print('{:>14} {:>12}'.format('path', 'rows/sec'))
+    print('{:>14} {:>12.1f}'.format('one-at-a-time', args.rows / single))
+    print('{:>14} {:>12.1f}'.format('bulk', args.rows / bulk))
+
+if __name__ == '__main__':
+    main()
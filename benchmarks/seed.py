@@ -0,0 +1,194 @@
+"""Seeds a reproducible synthetic dataset for the API benchmarks.
+
+Every seeded user has an @bench.example.com address, so the data can be
+removed again with --clean. The same --seed always produces the same rows:
+
+    python -m benchmarks.seed --users 50 --runs 200 --intervals 4 --comments 2 --follows 10 --tracks 1
+    python -m benchmarks.seed --clean
+"""
+import argparse
+import math
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam
+from application import app, db
+import models
+import stats
+import feed
+import records
+import tracks
+from passwords import hash_password
+
+EMAIL_DOMAIN = 'bench.example.com'
+PASSWORD = 'benchmark password'
+FIRST_NAMES = ('Ada', 'Ben', 'Cara', 'Dan', 'Eve', 'Finn', 'Gail', 'Hugo', 'Iris', 'Jon')
+LAST_NAMES = ('Abbott', 'Baker', 'Castillo', 'Dixon', 'Ellis', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Jensen')
+RUN_TYPES = ('easy', 'tempo', 'long', 'intervals', 'recovery')
+LOCATIONS = ('Park loop', 'River trail', 'Track', 'Hill repeats', 'Treadmill')
+NOTES = ('Felt easy', 'Windy but strong', 'Heavy legs today', 'Negative split', 'Hot and humid')
+COMMENTS = ('Nice work!', 'Great pace', 'Keep it up', 'Solid effort', 'See you at the track')
+
+BATCH_SIZE = 1000
+
+def bench_users():
+    return models.User.query.filter(models.User.email.like('%@' + EMAIL_DOMAIN)).order_by(models.User.id)
+
+def insert_rows(table, rows):
+    """Inserts rows and returns their ids, in batches where the database supports RETURNING."""
+    if not db.engine.dialect.implicit_returning:
+        return [db.session.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+    ids = []
+    for i in range(0, len(rows), BATCH_SIZE):
+        result = db.session.execute(table.insert().values(rows[i:i + BATCH_SIZE]).returning(table.c.id))
+        ids.extend(row[0] for row in result)
+    return ids
+
+def track_points(rng, start, distance, duration):
+    """A noisy loop of roughly the run's distance, one point a second."""
+    radius = distance / (2 * math.pi)
+    center_lat, center_lon = 40.0 + rng.random(), -75.0 + rng.random()
+    for second in range(0, duration + 1):
+        angle = 2 * math.pi * second / duration
+        north = radius * math.sin(angle) + rng.gauss(0, 0.5)
+        east = radius * math.cos(angle) + rng.gauss(0, 0.5)
+        yield (center_lat + north / 111320.0, center_lon + east / (111320.0 * math.cos(math.radians(center_lat))),
+               start + second, 50 + 10 * math.sin(angle * 3) + rng.gauss(0, 0.2))
+
+def seed(users, runs, intervals, comments, follows=0, tracks_per_user=0, seed_value=0):
+    rng = random.Random(seed_value)
+    now = datetime.utcnow().replace(microsecond=0)
+    # One low-cost hash shared by every user keeps seeding fast.
+    password = hash_password(PASSWORD, 4)
+
+    user_ids = insert_rows(models.User.__table__, [{
+        'first_name': FIRST_NAMES[i % len(FIRST_NAMES)],
+        'last_name': LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)],
+        'email': 'bench{}@{}'.format(i, EMAIL_DOMAIN),
+        'password': password,
+        'is_active': True,
+        'metric': i % 2 == 0,
+        'run_count': runs,
+        'created': now,
+        'updated': now
+    } for i in range(users)])
+
+    run_rows = []
+    for user_id in user_ids:
+        for i in range(runs):
+            run_rows.append({
+                'user_id': user_id,
+                'run_date': now - timedelta(days=i, minutes=rng.randint(0, 720)),
+                'distance': rng.randint(1000, 42000),
+                'duration': rng.randint(300, 14400),
+                'metric': True,
+                'warmup': rng.choice((None, 800, 1600)),
+                'cooldown': rng.choice((None, 800, 1600)),
+                'run_type': rng.choice(RUN_TYPES),
+                'location': rng.choice(LOCATIONS),
+                'notes': rng.choice(NOTES),
+                'interval_count': intervals,
+                'comment_count': comments,
+                'created': now,
+                'updated': now
+            })
+    run_ids = insert_rows(models.Run.__table__, run_rows)
+
+    last_run_dates = {}
+    for row in run_rows:
+        last_run_dates[row['user_id']] = max(row['run_date'], last_run_dates.get(row['user_id'], row['run_date']))
+    if last_run_dates:
+        users = models.User.__table__
+        db.session.execute(
+            users.update().where(users.c.id == bindparam('user_id')).values(last_run_date=bindparam('last_run_date')),
+            [{'user_id': user_id, 'last_run_date': date} for user_id, date in last_run_dates.items()]
+        )
+
+    # Each user's most recent runs get a GPS track.
+    epoch = datetime(1970, 1, 1)
+    for i, (run_id, row) in enumerate(zip(run_ids, run_rows)):
+        if i % runs < tracks_per_user:
+            points = track_points(rng, (row['run_date'] - epoch).total_seconds(), row['distance'], row['duration'])
+            db.session.add(tracks.build_track(models.Track(run_id=run_id, created=now, updated=now), points))
+
+    interval_rows = []
+    comment_rows = []
+    for run_id in run_ids:
+        for _ in range(intervals):
+            interval_rows.append({
+                'run_id': run_id, 'distance': 400, 'duration': rng.randint(60, 100),
+                'metric': True, 'created': now, 'updated': now
+            })
+        for _ in range(comments):
+            comment_rows.append({
+                'run_id': run_id, 'user_id': rng.choice(user_ids), 'comment': rng.choice(COMMENTS),
+                'created': now, 'updated': now
+            })
+
+    for table, rows in ((models.Interval.__table__, interval_rows), (models.RunComment.__table__, comment_rows)):
+        for i in range(0, len(rows), BATCH_SIZE):
+            db.session.execute(table.insert(), rows[i:i + BATCH_SIZE])
+
+    # One finished job each, for the job endpoints.
+    insert_rows(models.Job.__table__, [{
+        'kind': 'backfill_stats', 'user_id': user_id, 'payload': {'user_id': user_id}, 'status': 'succeeded',
+        'attempts': 1, 'max_attempts': 1, 'run_at': now, 'result': {'user_id': user_id}, 'created': now, 'updated': now
+    } for user_id in user_ids])
+
+    # Each user follows the next `follows` users, wrapping around.
+    follows = min(follows, len(user_ids) - 1)
+    follow_rows = [
+        {'follower_id': user_id, 'followed_id': user_ids[(i + offset) % len(user_ids)], 'created': now}
+        for i, user_id in enumerate(user_ids)
+        for offset in range(1, follows + 1)
+    ]
+    if follow_rows:
+        db.session.execute(models.Follow.__table__.insert(), follow_rows)
+        models.User.query.filter(models.User.id.in_(user_ids)) \
+            .update({'follower_count': follows}, synchronize_session=False)
+
+    db.session.commit()
+
+    if db.engine.dialect.name == 'postgresql':
+        stats.backfill()
+        records.backfill()
+        if follow_rows:
+            for user_id in user_ids:
+                feed.backfill(user_id)
+            db.session.commit()
+
+    return len(user_ids), len(run_ids), len(interval_rows), len(comment_rows)
+
+def clean():
+    user_ids = db.session.query(models.User.id).filter(models.User.email.like('%@' + EMAIL_DOMAIN)).subquery()
+
+    # Runs, intervals, comments, follows, timelines, records, tracks and
+    # summaries all go with their users: ON DELETE CASCADE. Jobs only lose
+    # their user_id, so delete those first.
+    models.Job.query.filter(models.Job.user_id.in_(user_ids)).delete(synchronize_session=False)
+    models.User.query.filter(models.User.id.in_(user_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=100, help='Runs per user')
+    parser.add_argument('--intervals', type=int, default=4, help='Intervals per run')
+    parser.add_argument('--comments', type=int, default=2, help='Comments per run')
+    parser.add_argument('--follows', type=int, default=10, help='Users each user follows')
+    parser.add_argument('--tracks', type=int, default=1, help='Runs per user with a GPS track')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clean', action='store_true', help='Remove previously seeded data and exit')
+    args = parser.parse_args()
+
+    clean()
+    if args.clean:
+        print('Removed benchmark data')
+        return
+
+    counts = seed(args.users, args.runs, args.intervals, args.comments, args.follows, args.tracks, args.seed)
+    print('Seeded {} users, {} runs, {} intervals, {} comments'.format(*counts))
+
+if __name__ == '__main__':
+    with app.app_context():
+        main()
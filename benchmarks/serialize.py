@@ -0,0 +1,98 @@
+"""Serialize-and-encode time for a page of runs, old path against the Serializer.
+
+Builds transient runs in memory (no database needed) that all belong to one
+user, the way RunList and UserRuns responses do:
+
+    python -m benchmarks.serialize --runs 10000 --backends json orjson ujson
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from application import app
+import models
+from serializers import Serializer, JSON_BACKENDS
+from constants import ISO_FORMAT
+
+def build_runs(count):
+    now = datetime.utcnow()
+    user = models.User(id=1, first_name='Bench', last_name='Runner', email='bench@example.com',
+                       is_active=True, metric=True, created=now, updated=now)
+    return [
+        models.Run(id=i, user=user, run_date=now - timedelta(days=i), distance=5000, duration=1500,
+                   metric=True, warmup=1000, cooldown=1000, run_type='easy', location='Park',
+                   notes='Easy run', created=now, updated=now)
+        for i in range(count)
+    ]
+
+def legacy_user(user):
+    return {
+        'id': user.id,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+        'is_active': user.is_active,
+        'metric': user.metric,
+        'created': user.created.strftime(ISO_FORMAT),
+        'updated': user.updated.strftime(ISO_FORMAT)
+    }
+
+def legacy_run(run):
+    # The serialize() body models.py had before the serializers module.
+    return {
+        'id': run.id,
+        'user': legacy_user(run.user),
+        'run_date': run.run_date.strftime(ISO_FORMAT),
+        'distance': run.distance,
+        'duration': run.duration,
+        'metric': run.metric,
+        'warmup': run.warmup,
+        'cooldown': run.cooldown,
+        'run_type': run.run_type,
+        'location': run.location,
+        'notes': run.notes,
+        'created': run.created.strftime(ISO_FORMAT),
+        'updated': run.updated.strftime(ISO_FORMAT)
+    }
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backends', nargs='+', default=['json'] + sorted(JSON_BACKENDS))
+    args = parser.parse_args()
+
+    runs = build_runs(args.runs)
+
+    def legacy():
+        return json.dumps({'runs': [legacy_run(run) for run in runs]})
+
+    results = [('legacy strftime + json', best_of(legacy, args.repeat))]
+
+    for backend in args.backends:
+        dumps = json.dumps if backend == 'json' else JSON_BACKENDS[backend]
+
+        def current():
+            serializer = Serializer()
+            return dumps({'runs': [serializer.run(run) for run in runs]})
+
+        try:
+            results.append(('serializer + {}'.format(backend), best_of(current, args.repeat)))
+        except ImportError:
+            print('Skipping {}: not installed'.format(backend))
+
+    print('{:>28} {:>10}'.format('path', 'ms'))
+    for name, elapsed in results:
+        print('{:>28} {:>10.1f}'.format(name, elapsed * 1000))
+
+if __name__ == '__main__':
+    with app.app_context():
+        main()
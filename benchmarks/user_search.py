@@ -0,0 +1,71 @@
+"""Latency of /api/users/search queries against a large users table.
+
+Seeds synthetic users (tagged with a bench- email prefix and reused on later
+runs) until the table holds --users rows, then times searches:
+
+    python -m benchmarks.user_search --users 1000000 --queries 200
+"""
+import argparse
+import random
+import string
+import time
+from datetime import datetime
+from application import app, db
+import models
+from search import UserSearchPage
+from benchmarks.bcrypt_rounds import percentile
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez']
+
+def random_name(names):
+    return random.choice(names) + ''.join(random.choice(string.ascii_lowercase) for _ in range(3))
+
+def seed(count, batch_size=10000):
+    existing = models.User.query.count()
+    now = datetime.utcnow()
+    table = models.User.__table__
+
+    for start in range(existing, count, batch_size):
+        rows = [{
+            'first_name': random_name(FIRST_NAMES),
+            'last_name': random_name(LAST_NAMES),
+            'email': 'bench-{}-{}@example.com'.format(i, int(time.time())),
+            'password': 'x' * 60,
+            'is_active': True,
+            'metric': False,
+            'created': now,
+            'updated': now
+        } for i in range(start, min(count, start + batch_size))]
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+    db.session.execute('ANALYZE users')
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.users)
+
+        terms = [random.choice(FIRST_NAMES)[:3] for _ in range(args.queries // 2)]
+        terms += ['{} {}'.format(random.choice(FIRST_NAMES), random.choice(LAST_NAMES)[:-1]) for _ in range(args.queries // 2)]
+
+        latencies = []
+        for term in terms:
+            start = time.perf_counter()
+            UserSearchPage(term)
+            latencies.append(time.perf_counter() - start)
+            db.session.expunge_all()
+
+    print('users: {}  queries: {}'.format(args.users, len(latencies)))
+    print('p50 {:.1f} ms  p95 {:.1f} ms  p99 {:.1f} ms'.format(
+        percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000, percentile(latencies, 99) * 1000
+    ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from werkzeug.utils import import_string
+
+class LRUCache(object):
+    """In-process cache bounded to max_size entries, each expiring after ttl seconds."""
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires < time.time():
+                del self.data[key]
+                return None
+
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.time() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+class RedisCache(object):
+    """Shared cache for multi-worker deployments. Requires the redis package."""
+
+    def __init__(self, url, ttl=60, prefix=''):
+        import redis
+
+        self.client = redis.StrictRedis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + str(key))
+        if value is None:
+            return None
+        return pickle.loads(value)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [None if value is None else pickle.loads(value) for value in self.client.mget([self.prefix + str(key) for key in keys])]
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + str(key), self.ttl, pickle.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + str(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+class TieredCache(object):
+    """Checks the local LRU first and then the optional shared tier, counting hits and misses.
+
+    local may be None when every read must go to the shared tier.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                self.local_hits += 1
+                return value
+
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.shared_hits += 1
+                if self.local is not None:
+                    self.local.set(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        if self.local is not None:
+            self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def delete(self, key):
+        if self.local is not None:
+            self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        if self.local is not None:
+            self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            'size': len(self.local) if self.local is not None else 0,
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': (self.local_hits + self.shared_hits) / lookups if lookups else 0.0
+        }
+
+def shared_backend(backend, url, ttl, prefix):
+    if not backend:
+        return None
+    return import_string(backend)(url, ttl=ttl, prefix=prefix)
+
+def tiered_cache(config, name, exact=False):
+    """Builds a TieredCache from the <NAME>_CACHE_* settings in config.
+
+    With exact, a configured shared tier is the only tier, so a delete in one
+    process is seen by every other at once instead of after the local TTL.
+    """
+    name = name.upper()
+    shared = shared_backend(
+        config.get('{}_CACHE_BACKEND'.format(name)),
+        config.get('CACHE_URL'),
+        config['{}_CACHE_TTL'.format(name)],
+        name.lower() + ':'
+    )
+    local = None
+    if shared is None or not exact:
+        local = LRUCache(config['{}_CACHE_SIZE'.format(name)], config['{}_CACHE_TTL'.format(name)])
+    return TieredCache(local, shared)
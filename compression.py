@@ -0,0 +1,56 @@
+import gzip
+from flask import request, current_app
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/csv', 'application/x-ndjson'}
+
+# Appended to the ETag of an encoded response, since each encoding is a
+# different representation. conditional.Validators accepts every variant.
+ENCODING_ETAG_SUFFIXES = {'gzip': '-gzip', 'br': '-br'}
+
+def brotli_compress(data, quality):
+    import brotli
+    return brotli.compress(data, quality=quality)
+
+def available_encodings():
+    encodings = ['gzip']
+    try:
+        import brotli
+        encodings.insert(0, 'br')
+    except ImportError:
+        pass
+    return encodings
+
+def compress_response(response):
+    """Gzip or Brotli encodes buffered responses over COMPRESS_MIN_SIZE bytes, as the client accepts."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    config = current_app.config
+    if response.content_length is not None and response.content_length < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = request.accept_encodings.best_match(current_app.extensions['compression_encodings'])
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if encoding == 'br':
+        data = brotli_compress(data, config['COMPRESS_BROTLI_QUALITY'])
+    else:
+        data = gzip.compress(data, config['COMPRESS_LEVEL'])
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag + ENCODING_ETAG_SUFFIXES[encoding])
+
+    return response
+
+def init_compression(app):
+    app.extensions['compression_encodings'] = available_encodings()
+    app.after_request(compress_response)
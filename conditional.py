@@ -0,0 +1,105 @@
+import hashlib
+from datetime import datetime
+from flask import request, make_response
+from sqlalchemy import func
+from werkzeug.http import is_resource_modified
+from application import db
+import models
+from serializers import jsonify
+from compression import ENCODING_ETAG_SUFFIXES
+
+class Validators(object):
+    """Strong ETag and Last-Modified for a response, built from ids, counts and updated timestamps.
+
+    Parts should cover everything embedded in the response body, so any write
+    that changes the body also changes the ETag. List resources also pass the
+    query string, since it selects the page.
+
+    Collections get no Last-Modified: deleting a row can leave the newest
+    updated timestamp unchanged, so only the ETag notices.
+    """
+
+    def __init__(self, *parts, collection=False):
+        dates = [part for part in parts if isinstance(part, datetime)]
+        self.tag(
+            hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest(),
+            max(dates).replace(microsecond=0) if dates and not collection else None
+        )
+
+    @classmethod
+    def restore(cls, etag, last_modified):
+        """Validators for a tag computed earlier, e.g. by a response that was cached."""
+        validators = cls.__new__(cls)
+        validators.tag(etag, last_modified)
+        return validators
+
+    def tag(self, etag, last_modified):
+        self.etag = etag
+        # Compressed responses carry the same tag with the encoding appended.
+        self.etags = [etag] + [etag + suffix for suffix in ENCODING_ETAG_SUFFIXES.values()]
+        self.last_modified = last_modified
+
+    def apply(self, response):
+        response.set_etag(self.etag)
+        if self.last_modified:
+            response.last_modified = self.last_modified
+        return response
+
+def aggregate_query(query, model, *columns):
+    return query.with_entities(func.max(model.updated), func.count(model.id), *columns).order_by(None)
+
+def aggregate(query, model, *columns):
+    """(max(updated), count) of a query, plus any extra columns, cheap enough to run before serializing anything."""
+    return aggregate_query(query, model, *columns).one()
+
+def updated_column(model, id):
+    """A row's updated timestamp as a scalar subquery, to read it in the same statement as an aggregate."""
+    return db.session.query(model.updated).filter(model.id == id).as_scalar()
+
+def comment_aggregate_query(run_id):
+    # Comments embed their author, so author profile changes count too.
+    return db.session.query(func.max(models.RunComment.updated), func.max(models.User.updated), func.count(models.RunComment.id)) \
+        .join(models.User, models.RunComment.user_id == models.User.id) \
+        .filter(models.RunComment.run_id == run_id)
+
+def comment_aggregate(run_id):
+    return comment_aggregate_query(run_id).one()
+
+def user_validators(user):
+    return Validators('user', user.id, user.updated)
+
+def run_validators(run):
+    intervals = models.Interval.query.filter_by(run_id=run.id)
+    return Validators(
+        'run', run.id, run.updated, run.user.updated,
+        *comment_aggregate(run.id) + aggregate(intervals, models.Interval)
+    )
+
+def comment_validators(comment):
+    return Validators(
+        'comment', comment.id, comment.updated, comment.user.updated,
+        comment.run.updated, comment.run.user.updated
+    )
+
+def interval_validators(interval):
+    return Validators('interval', interval.id, interval.updated, interval.run.updated, interval.run.user.updated)
+
+def respond(validators, build):
+    """Returns 304 when the client's copy is current, otherwise builds the response and tags it."""
+    for etag in validators.etags:
+        if not is_resource_modified(request.environ, etag=etag, last_modified=validators.last_modified):
+            return validators.apply(make_response('', 304))
+
+    response = make_response(build())
+    if response.status_code == 200:
+        validators.apply(response)
+    return response
+
+def precondition_failed(validators):
+    if not request.if_match or request.if_match.star_tag:
+        return None
+
+    if any(request.if_match.contains(etag) for etag in validators.etags):
+        return None
+
+    return make_response(jsonify({'error': 'Resource has been modified'}), 412)
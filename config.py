@@ -1,8 +1,30 @@
 import os
 from datetime import timedelta
+from sqlalchemy.engine.url import make_url
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+def uses_psycopg2(url):
+    # psycopg2 is the default PostgreSQL driver.
+    return make_url(url).drivername in {'postgres', 'postgresql', 'postgresql+psycopg2'}
+
+def engine_options(pool_size, max_overflow, statement_timeout, pool_recycle=1800, pool_timeout=10, url=None):
+    # Environment variables override the per-environment defaults, e.g. for load tests.
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_recycle': pool_recycle,
+        'pool_timeout': pool_timeout,
+        'pool_pre_ping': True
+    }
+    # Driver-specific: other dialects, e.g. SQLite for tests, reject these.
+    if uses_psycopg2(url or os.environ['DATABASE_URL']):
+        options['executemany_mode'] = 'values'
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(int(os.environ.get('DB_STATEMENT_TIMEOUT', statement_timeout)))
+        }
+    return options
+
 class Config(object):
     DEBUG = False
     TESTING = False
@@ -10,21 +32,57 @@ class Config(object):
     SECRET_KEY = os.environ['SECRET_KEY']
     SQLALCHEMY_DATABASE_URI = os.environ['DATABASE_URL']
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=10, statement_timeout=5000)
+    SQLALCHEMY_BINDS = {
+        'replica_{}'.format(i): url
+        for i, url in enumerate(url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url)
+    }
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'json')
+    SLOW_REQUEST_SECONDS = 1.0
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
     JWT_AUTH_URL_RULE = '/api/login'
     JWT_AUTH_USERNAME_KEY = 'email'
     JWT_AUTH_HEADER_PREFIX = 'Bearer'
     JWT_EXPIRATION_DELTA = timedelta(days=30)
+    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_POOL_SIZE = 2
+    PASSWORD_POOL_MAX_PENDING = 8
+    PASSWORD_POOL_TIMEOUT = 5
+    CACHE_URL = os.environ.get('CACHE_URL')
+    IDENTITY_CACHE_SIZE = 10000
+    IDENTITY_CACHE_TTL = 60
+    IDENTITY_CACHE_BACKEND = os.environ.get('IDENTITY_CACHE_BACKEND')
+    STICKY_CACHE_SIZE = 100000
+    STICKY_CACHE_TTL = 5
+    STICKY_CACHE_BACKEND = os.environ.get('STICKY_CACHE_BACKEND')
+    RESPONSE_CACHE_SIZE = 5000
+    RESPONSE_CACHE_TTL = 300
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND')
+    # Without a shared backend, only a single-process deployment sees every write.
+    RESPONSE_CACHE_LOCAL = os.environ.get('RESPONSE_CACHE_LOCAL') == 'true'
+    VERSION_CACHE_SIZE = 100000
+    VERSION_CACHE_TTL = 86400
 
 class ProductionConfig(Config):
     DEBUG = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=10, max_overflow=20, statement_timeout=5000)
 
 class StagingConfig(Config):
     DEVELOPMENT = True
     DEBUG = True
+    BCRYPT_LOG_ROUNDS = 10
 
 class DevelopmentConfig(Config):
     DEVELOPMENT = True
     DEBUG = True
+    BCRYPT_LOG_ROUNDS = 10
+    PASSWORD_POOL_SIZE = 0
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=2, max_overflow=5, statement_timeout=30000)
 
 class TestingConfig(Config):
-    TESTING = True
\ No newline at end of file
+    TESTING = True
+    BCRYPT_LOG_ROUNDS = 4
+    PASSWORD_POOL_SIZE = 0
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=2, max_overflow=2, statement_timeout=30000)
\ No newline at end of file
@@ -1,4 +1,29 @@
 ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 DEFAULT_PAGE = 1
 DEFAULT_PAGE_SIZE = 25
-MAX_PAGE_SIZE = 100
\ No newline at end of file
+MAX_PAGE_SIZE = 100
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+METERS_PER_YARD = 0.9144
+SUMMARY_PERIODS = ('week', 'month', 'year')
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ERRORS = 1000
+EXPORT_CHUNK_SIZE = 500
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+FEED_FANOUT_LIMIT = 5000
+FEED_BACKFILL_RUNS = 100
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_SECONDS = 5
+JOB_MAX_BACKOFF_SECONDS = 3600
+JOB_LOCK_TIMEOUT_SECONDS = 900
+JOB_POLL_SECONDS = 1.0
+JOB_HEARTBEAT_SECONDS = 60
+RECORD_DISTANCES = (('1k', 1000.0), ('mile', 1609.344), ('5k', 5000.0), ('10k', 10000.0), ('half_marathon', 21097.5), ('marathon', 42195.0))
+LONGEST_RUN = 'longest_run'
+MAX_BATCH_INTERVALS = 500
+MAX_TRACK_POINTS = 200000
+TRACK_DEFAULT_TOLERANCE = 5.0
+TRACK_MIN_TOLERANCE = 0.5
+TRACK_MAX_TOLERANCE = 1000.0
+RECONCILE_BATCH_SIZE = 1000
+PURGE_BATCH_SIZE = 500
+PURGE_GRACE_DAYS = 30
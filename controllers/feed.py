@@ -0,0 +1,67 @@
+from flask import request, make_response
+from flask_restful import Resource
+from flask_jwt import jwt_required, current_identity
+from application import db
+from auth import invalidate_identity
+import models
+from serializers import jsonify, Serializer, Projection
+from pagination import parse_page_size
+import feed
+
+class Feed(Resource):
+    @jwt_required()
+    def get(self):
+        projection, error = Projection.from_request('run')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        page = feed.FeedPage(current_identity.id, request.args.get('cursor'), parse_page_size(request.args.get('page_size')), projection)
+        if not page.valid:
+            return make_response(jsonify({'error': 'Invalid cursor'}), 400)
+
+        serializer = Serializer(projection)
+        return jsonify({'runs': [serializer.run(run) for run in page.items], 'next_cursor': page.next_cursor})
+
+class UserFollow(Resource):
+    @staticmethod
+    def check_user(user_id):
+        if user_id == current_identity.id:
+            return make_response(jsonify({'error': 'You cannot follow yourself'}), 400)
+
+        if models.User.query.filter_by(id=user_id).first() is None:
+            return make_response(jsonify({'error': 'User does not exist'}), 404)
+
+    @jwt_required()
+    def post(self, user_id):
+        error = self.check_user(user_id)
+        if error:
+            return error
+
+        try:
+            created = feed.follow(current_identity.id, user_id)
+            db.session.commit()
+        except:
+            return make_response(jsonify({'error': 'Unable to follow user'}), 500)
+
+        invalidate_identity(user_id)
+
+        return make_response(jsonify({'message': 'Following user'}), 201 if created else 200)
+
+    @jwt_required()
+    def delete(self, user_id):
+        error = self.check_user(user_id)
+        if error:
+            return error
+
+        try:
+            removed = feed.unfollow(current_identity.id, user_id)
+            db.session.commit()
+        except:
+            return make_response(jsonify({'error': 'Unable to unfollow user'}), 500)
+
+        if not removed:
+            return make_response(jsonify({'error': 'You are not following this user'}), 404)
+
+        invalidate_identity(user_id)
+
+        return jsonify({'message': 'Unfollowed user'})
@@ -0,0 +1,26 @@
+from flask import make_response
+from flask_restful import Resource
+from flask_jwt import jwt_required, current_identity
+import models
+from serializers import jsonify, Serializer
+from pagination import job_page
+
+class JobList(Resource):
+    @jwt_required()
+    def get(self):
+        jobs = models.Job.query.filter_by(user_id=current_identity.id)
+        page = job_page(jobs)
+        if not page.valid:
+            return make_response(jsonify({'error': 'Invalid cursor'}), 400)
+
+        serializer = Serializer()
+        return jsonify({'jobs': [serializer.job(job) for job in page.items], 'next_cursor': page.next_cursor})
+
+class JobDetail(Resource):
+    @jwt_required()
+    def get(self, job_id):
+        job = models.Job.query.filter_by(id=job_id).first()
+        if job is None or job.user_id != current_identity.id:
+            return make_response(jsonify({'error': 'Job does not exist'}), 404)
+
+        return jsonify({'job': Serializer().job(job)})
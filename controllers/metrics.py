@@ -0,0 +1,46 @@
+from flask import Response
+from flask_restful import Resource
+from flask_jwt import jwt_required
+from application import db
+from auth import identity_cache
+import responses
+from pool import pool_stats, checkout_wait
+from serializers import jsonify
+from instrumentation import registry
+from metrics import render_histogram, render_value
+
+class CacheMetrics(Resource):
+    @jwt_required()
+    def get(self):
+        return jsonify({'identity': identity_cache.stats(), 'response': responses.stats()})
+
+class PoolMetrics(Resource):
+    @jwt_required()
+    def get(self):
+        return jsonify({'pool': pool_stats(db.engine)})
+
+class Metrics(Resource):
+    def get(self):
+        lines = registry.render()
+
+        lines.append('# TYPE db_pool_checkout_wait_seconds histogram')
+        lines.extend(render_histogram('db_pool_checkout_wait_seconds', {}, checkout_wait))
+        for key, value in sorted(pool_stats(db.engine).items()):
+            if key != 'checkout_wait':
+                lines.append('# TYPE db_pool_{} gauge'.format(key))
+                lines.append(render_value('db_pool_{}'.format(key), {}, value))
+
+        stats = identity_cache.stats()
+        lines.append('# TYPE identity_cache_lookups_total counter')
+        for result in ('local_hits', 'shared_hits', 'misses'):
+            lines.append(render_value('identity_cache_lookups_total', {'result': result}, stats[result]))
+
+        lines.append('# TYPE response_cache_lookups_total counter')
+        for endpoint, counts in sorted(responses.lookups.items()):
+            for result in ('hits', 'misses'):
+                lines.append(render_value('response_cache_lookups_total', {'endpoint': endpoint, 'result': result}, counts[result]))
+        lines.append('# TYPE response_cache_stores_total counter')
+        for endpoint, counts in sorted(responses.lookups.items()):
+            lines.append(render_value('response_cache_stores_total', {'endpoint': endpoint}, counts['stored']))
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -1,18 +1,49 @@
-from flask import jsonify, request, make_response
+from flask import request, make_response
 from flask_restful import Resource
 from flask_jwt import jwt_required, current_identity
-from sqlalchemy import desc
 import models
 from helpers import parse_date, parse_bool, parse_int
 from application import db
+from auth import invalidate_identity
+from serializers import jsonify, Serializer, Projection, run_options, interval_options, comment_options
+from pagination import filter_date_range, run_page, comment_page, interval_page
+import stats
+import imports
+import uploads
+import feed
+import jobs
+import records
+import counters
+from responses import cached, touch
+from conditional import Validators, aggregate, updated_column, respond, precondition_failed, run_validators, comment_validators, interval_validators, comment_aggregate
+from constants import MAX_BATCH_INTERVALS
 
 class RunList(Resource):
     @jwt_required()
     def get(self):
+        projection, error = Projection.from_request('run')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
         user_id = current_identity.id
-        runs = models.Run.query.filter_by(user_id=user_id).order_by(desc('run_date'))
-        runs = [run.serialize() for run in runs]
-        return jsonify({'runs': runs})
+        runs = models.Run.query.filter_by(user_id=user_id).options(*run_options(projection=projection))
+
+        runs, error = filter_date_range(runs, models.Run.run_date)
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        # Runs embed their user, whose updated must come from the database: the identity may be cached.
+        validators = Validators('runs', request.query_string, *aggregate(runs, models.Run, updated_column(models.User, user_id)), collection=True)
+
+        def build():
+            page = run_page(runs)
+            if not page.valid:
+                return make_response(jsonify({'error': 'Invalid cursor'}), 400)
+
+            serializer = Serializer(projection)
+            return jsonify({'runs': [serializer.run(run) for run in page.items], 'next_cursor': page.next_cursor})
+
+        return respond(validators, build)
 
     @jwt_required()
     def post(self):
@@ -37,16 +68,66 @@ class RunList(Resource):
 
         try:
             db.session.add(run)
+            stats.record_run(run)
+            db.session.flush()
+            feed.fan_out([run.id])
+            records.offer([records.run_effort(run)])
+            counters.add_runs(user_id, 1, run.run_date)
             db.session.commit()
         except Exception as e:
             return make_response(jsonify({'error': 'Unable to create new run'}), 500)
 
+        invalidate_identity(user_id)
+
         return make_response(jsonify({'run': run.serialize()}), 201)
 
+class RunImport(Resource):
+    @jwt_required()
+    def post(self):
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                return make_response(jsonify({'error': 'Must supply file'}), 400)
+            stream, name, mimetype = upload.stream, upload.filename, upload.mimetype
+        else:
+            stream, name, mimetype = request.stream, None, request.mimetype
+
+        import_format = request.args.get('format') or imports.detect_format(name, mimetype)
+        if import_format not in imports.IMPORT_FORMATS:
+            return make_response(jsonify({'error': 'Format must be ndjson or csv'}), 400)
+
+        run_async = parse_bool(request.args.get('async', 'false'))
+        if run_async is None:
+            return make_response(jsonify({'error': 'Invalid async value'}), 400)
+
+        if run_async:
+            # Staged in chunks, so neither this request nor the job holds the whole file.
+            try:
+                upload = uploads.stage(stream, current_identity.id, 'utf-8')
+            except UnicodeDecodeError:
+                db.session.rollback()
+                return make_response(jsonify({'error': 'File must be UTF-8'}), 400)
+            except:
+                db.session.rollback()
+                return make_response(jsonify({'error': 'Unable to queue import'}), 500)
+
+            # Not retried: batches that committed before a failure would be imported twice.
+            job = jobs.enqueue('import_runs', {'format': import_format, 'upload_id': upload.id}, current_identity.id, max_attempts=1)
+            try:
+                db.session.commit()
+            except:
+                return make_response(jsonify({'error': 'Unable to queue import'}), 500)
+
+            return make_response(jsonify({'job': Serializer().job(job)}), 202, {'Location': '/api/jobs/{}'.format(job.id)})
+
+        rows = imports.IMPORT_FORMATS[import_format](stream)
+        report = imports.import_runs(rows, current_identity)
+        return make_response(jsonify(report.serialize()), 201 if report.imported else 400)
+
 class RunDetail(Resource):
     @staticmethod
-    def get_run(run_id):
-        return models.Run.query.filter_by(id=run_id).first()
+    def get_run(run_id, options=()):
+        return models.Run.query.filter_by(id=run_id).options(*options).first()
 
     @staticmethod
     def send_404():
@@ -58,11 +139,28 @@ class RunDetail(Resource):
 
     @jwt_required()
     def get(self, run_id):
-        run = self.get_run(run_id)
+        return cached([('run', run_id)], lambda: self.render(run_id))
+
+    def render(self, run_id):
+        projection, error = Projection.from_request('run')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        run = self.get_run(run_id, run_options())
         if not run:
             return self.send_404()
-        
-        return jsonify({'run': run.serialize(include_comments=True, include_intervals=True)})
+
+        include_comments = projection.includes('comments')
+        include_intervals = projection.includes('intervals')
+
+        def build():
+            detail = models.Run.query.filter_by(id=run_id) \
+                .options(*run_options(include_comments, include_intervals, projection)) \
+                .populate_existing() \
+                .first()
+            return jsonify({'run': Serializer(projection).run(detail, include_comments, include_intervals)})
+
+        return respond(run_validators(run), build)
 
     @jwt_required()
     def put(self, run_id):
@@ -73,6 +171,12 @@ class RunDetail(Resource):
         if run.user_id != current_identity.id:
             return self.send_403()
 
+        failed = precondition_failed(run_validators(run))
+        if failed:
+            return failed
+
+        previous = stats.contribution(run)
+
         if 'run_date' in request.form:
             run.run_date = parse_date(request.form['run_date'])
         if 'distance' in request.form:
@@ -98,9 +202,22 @@ class RunDetail(Resource):
             return make_response(jsonify({'error': error}), 400)
 
         try:
+            stats.apply_contribution(previous, -1)
+            stats.record_run(run)
+            if 'run_date' in request.form:
+                feed.move_run(run)
+            held = records.release(run.user_id, run_id=run.id)
+            db.session.flush()
+            records.recompute(run.user_id, held)
+            records.offer([records.run_effort(run)])
+            if 'run_date' in request.form:
+                counters.refresh_last_run_date(run.user_id)
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to update run'}), 500)
+
+        if 'run_date' in request.form:
+            invalidate_identity(run.user_id)
         
         return jsonify({'run': run.serialize()})
     
@@ -112,24 +229,57 @@ class RunDetail(Resource):
         
         if run.user_id != current_identity.id:
             return self.send_403()
+
+        failed = precondition_failed(run_validators(run))
+        if failed:
+            return failed
         
+        user_id = run.user_id
         try:
+            stats.unrecord_run(run)
+            held = records.release(user_id, run_id=run.id)
+            # Intervals, comments, timeline entries and the track go with it: ON DELETE CASCADE.
             db.session.delete(run)
+            db.session.flush()
+            records.recompute(user_id, held)
+            counters.remove_runs(user_id, 1)
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to delete run'}), 500)
 
+        invalidate_identity(user_id)
+
         return jsonify({'message': 'Successfully deleted run'})
 
 class CommentsList(Resource):
     @jwt_required()
     def get(self, run_id):
-        run = models.Run.query.filter_by(id=run_id).first()
+        return cached([('run', run_id)], lambda: self.render(run_id))
+
+    def render(self, run_id):
+        projection, error = Projection.from_request('comment')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        run = models.Run.query.filter_by(id=run_id).options(*run_options()).first()
         if not run:
             return make_response(jsonify({'error': 'Run does not exist'}), 404)
 
-        comments = [comment.serialize() for comment in run.run_comments]
-        return jsonify({'comments': comments})
+        validators = Validators(
+            'comments', run.id, run.updated, run.user.updated, request.query_string,
+            *comment_aggregate(run_id), collection=True
+        )
+
+        def build():
+            comments = models.RunComment.query.filter_by(run_id=run_id).options(*comment_options(projection))
+            page = comment_page(comments)
+            if not page.valid:
+                return make_response(jsonify({'error': 'Invalid cursor'}), 400)
+
+            serializer = Serializer(projection)
+            return jsonify({'comments': [serializer.comment(comment) for comment in page.items], 'next_cursor': page.next_cursor})
+
+        return respond(validators, build)
     
     @jwt_required()
     def post(self, run_id):
@@ -149,6 +299,7 @@ class CommentsList(Resource):
 
         try:
             db.session.add(comment)
+            counters.change_comment_count(run_id, 1)
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to add comment'}), 500)
@@ -158,11 +309,15 @@ class CommentsList(Resource):
 class CommentDetail(Resource):
     @jwt_required()
     def get(self, comment_id):
-        comment = models.RunComment.query.filter_by(id=comment_id).first()
+        projection, error = Projection.from_request('comment')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        comment = models.RunComment.query.filter_by(id=comment_id).options(*comment_options()).first()
         if comment is None:
             return make_response(jsonify({'error': 'Comment does not exist'}), 404)
 
-        return jsonify({'comment': comment.serialize()})
+        return respond(comment_validators(comment), lambda: jsonify({'comment': Serializer(projection).comment(comment)}))
 
     @jwt_required()
     def put(self, comment_id):
@@ -173,6 +328,10 @@ class CommentDetail(Resource):
         if comment.user_id != current_identity.id:
             return make_response(jsonify({'error': 'Unauthorized to update comment'}), 403)
 
+        failed = precondition_failed(comment_validators(comment))
+        if failed:
+            return failed
+
         if 'comment' in request.form:
             comment.comment = request.form['comment']
 
@@ -196,8 +355,13 @@ class CommentDetail(Resource):
         if comment.user_id != current_identity.id:
             return make_response(jsonify({'error': 'Unauthorized to update comment'}), 403)
 
+        failed = precondition_failed(comment_validators(comment))
+        if failed:
+            return failed
+
         try:
             db.session.delete(comment)
+            counters.change_comment_count(comment.run_id, -1)
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to delete comment'}), 500)
@@ -207,13 +371,30 @@ class CommentDetail(Resource):
 class IntervalList(Resource):
     @jwt_required()
     def get(self, run_id):
-        run = models.Run.query.filter_by(id=run_id).first()
+        projection, error = Projection.from_request('interval')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        run = models.Run.query.filter_by(id=run_id).options(*run_options()).first()
         if not run:
             return make_response(jsonify({'error': 'Run does not exist'}), 404)
 
-        intervals = models.Interval.query.filter_by(run_id=run_id)
-        intervals = [interval.serialize() for interval in intervals]
-        return jsonify({'intervals': intervals})
+        # Each interval's run is the one loaded above, so only the interval columns need projecting.
+        intervals = models.Interval.query.filter_by(run_id=run_id).options(*projection.columns('interval'))
+        validators = Validators(
+            'intervals', run.id, run.updated, run.user.updated, request.query_string,
+            *aggregate(intervals, models.Interval), collection=True
+        )
+
+        def build():
+            page = interval_page(intervals)
+            if not page.valid:
+                return make_response(jsonify({'error': 'Invalid cursor'}), 400)
+
+            serializer = Serializer(projection)
+            return jsonify({'intervals': [serializer.interval(interval) for interval in page.items], 'next_cursor': page.next_cursor})
+
+        return respond(validators, build)
 
     @jwt_required()
     def post(self, run_id):
@@ -237,6 +418,9 @@ class IntervalList(Resource):
 
         try:
             db.session.add(interval)
+            db.session.flush()
+            records.offer([records.interval_effort(interval, run)])
+            counters.change_interval_count(run_id, 1)
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to add interval'}), 500)
@@ -246,11 +430,15 @@ class IntervalList(Resource):
 class IntervalDetail(Resource):
     @jwt_required()
     def get(self, interval_id):
-        interval = models.Interval.query.filter_by(id=interval_id).first()
+        projection, error = Projection.from_request('interval')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        interval = models.Interval.query.filter_by(id=interval_id).options(*interval_options()).first()
         if interval is None:
             return make_response(jsonify({'error': 'Interval does not exist'}), 404)
 
-        return jsonify({'interval': interval.serialize()})
+        return respond(interval_validators(interval), lambda: jsonify({'interval': Serializer(projection).interval(interval)}))
 
     @jwt_required()
     def put(self, interval_id):
@@ -261,6 +449,10 @@ class IntervalDetail(Resource):
         if interval.run.user_id != current_identity.id:
             return make_response(jsonify({'error': 'Unauthorized to update this interval'}), 403)
 
+        failed = precondition_failed(interval_validators(interval))
+        if failed:
+            return failed
+
         if 'distance' in request.form:
             interval.distance = parse_int(request.form['distance'])
 
@@ -275,6 +467,10 @@ class IntervalDetail(Resource):
             return make_response(jsonify({'error': error}), 400)
 
         try:
+            held = records.release(interval.run.user_id, interval_id=interval.id)
+            db.session.flush()
+            records.recompute(interval.run.user_id, held)
+            records.offer([records.interval_effort(interval, interval.run)])
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to update interval'}), 500)
@@ -290,10 +486,100 @@ class IntervalDetail(Resource):
         if interval.run.user_id != current_identity.id:
             return make_response(jsonify({'error': 'Unauthorized to update this interval'}), 403)
 
+        failed = precondition_failed(interval_validators(interval))
+        if failed:
+            return failed
+
         try:
+            user_id = interval.run.user_id
+            held = records.release(user_id, interval_id=interval.id)
             db.session.delete(interval)
+            db.session.flush()
+            records.recompute(user_id, held)
+            counters.change_interval_count(interval.run_id, -1)
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to delete interval'}), 500)
 
-        return jsonify({'message': 'Successfully deleted interval'})
\ No newline at end of file
+        return jsonify({'message': 'Successfully deleted interval'})
+
+class IntervalBatch(Resource):
+    """Writes all of a run's intervals in one request and one transaction."""
+
+    @staticmethod
+    def get_owned_run(run_id):
+        run = models.Run.query.filter_by(id=run_id).first()
+        if not run:
+            return None, make_response(jsonify({'error': 'Run does not exist'}), 404)
+
+        if run.user_id != current_identity.id:
+            return None, make_response(jsonify({'error': 'Unauthorized to update intervals on this run'}), 403)
+
+        return run, precondition_failed(run_validators(run))
+
+    @staticmethod
+    def parse_intervals(run):
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('intervals'), list):
+            return None, 'Must supply a list of intervals'
+
+        if len(data['intervals']) > MAX_BATCH_INTERVALS:
+            return None, 'At most {} intervals per request'.format(MAX_BATCH_INTERVALS)
+
+        return imports.build_intervals(data['intervals'], run.metric)
+
+    def write(self, run_id, replace):
+        run, error = self.get_owned_run(run_id)
+        if error:
+            return error
+
+        intervals, error = self.parse_intervals(run)
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        try:
+            held = []
+            deleted = 0
+            if replace:
+                held = records.release_intervals(run.user_id, run.id)
+                deleted = models.Interval.query.filter_by(run_id=run.id).delete(synchronize_session=False)
+                touch(('run', run.id))
+            imports.insert_intervals([(interval, run) for interval in intervals])
+            counters.change_interval_count(run.id, len(intervals) - deleted)
+            records.recompute(run.user_id, held)
+            records.offer([records.interval_effort(interval, run) for interval in intervals])
+            db.session.commit()
+        except:
+            return make_response(jsonify({'error': 'Unable to save intervals'}), 500)
+
+        serializer = Serializer()
+        return make_response(jsonify({
+            'run_id': run.id,
+            'intervals': [serializer.compact_interval(interval) for interval in intervals]
+        }), 200 if replace else 201)
+
+    @jwt_required()
+    def post(self, run_id):
+        return self.write(run_id, replace=False)
+
+    @jwt_required()
+    def put(self, run_id):
+        return self.write(run_id, replace=True)
+
+    @jwt_required()
+    def delete(self, run_id):
+        run, error = self.get_owned_run(run_id)
+        if error:
+            return error
+
+        try:
+            held = records.release_intervals(run.user_id, run.id)
+            deleted = models.Interval.query.filter_by(run_id=run.id).delete(synchronize_session=False)
+            touch(('run', run.id))
+            counters.change_interval_count(run.id, -deleted)
+            records.recompute(run.user_id, held)
+            db.session.commit()
+        except:
+            return make_response(jsonify({'error': 'Unable to delete intervals'}), 500)
+
+        return jsonify({'run_id': run.id, 'deleted': deleted})
@@ -0,0 +1,39 @@
+from flask import request, make_response
+from flask_restful import Resource
+from flask_jwt import jwt_required, current_identity
+from helpers import parse_date
+from serializers import jsonify, Serializer, Projection
+from pagination import parse_page_size
+from search import ActivitySearch
+
+class Search(Resource):
+    @jwt_required()
+    def get(self):
+        projection, error = Projection.from_request('run')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        term = (request.args.get('q') or '').strip()
+        if not term:
+            return make_response(jsonify({'error': 'Must supply search term'}), 400)
+
+        filters = {'run_type': request.args.get('run_type')}
+        for arg in ('since', 'until'):
+            if arg in request.args:
+                filters[arg] = parse_date(request.args[arg])
+                if filters[arg] is None:
+                    return make_response(jsonify({'error': 'Invalid {} date'.format(arg)}), 400)
+
+        search = ActivitySearch(current_identity.id, term, parse_page_size(request.args.get('page_size')), projection)
+        serializer = Serializer(projection)
+
+        runs = [
+            {'run': serializer.run(run), 'rank': rank, 'snippet': snippet}
+            for run, rank, snippet in search.runs(**filters)
+        ]
+        comments = [
+            {'comment': serializer.comment(comment), 'rank': rank, 'snippet': snippet}
+            for comment, rank, snippet in search.comments(**filters)
+        ]
+
+        return jsonify({'runs': runs, 'comments': comments})
@@ -0,0 +1,115 @@
+from flask import request, make_response
+from flask_restful import Resource
+from flask_jwt import jwt_required, current_identity
+from application import db
+import models
+import tracks
+from serializers import jsonify, Serializer
+from conditional import Validators, respond
+from constants import TRACK_DEFAULT_TOLERANCE, TRACK_MIN_TOLERANCE, TRACK_MAX_TOLERANCE
+
+def get_track(run_id):
+    """Returns (run, track, error response)."""
+    run = models.Run.query.filter_by(id=run_id).first()
+    if run is None:
+        return None, None, make_response(jsonify({'error': 'Run does not exist'}), 404)
+
+    track = models.Track.query.filter_by(run_id=run_id).first()
+    if track is None:
+        return run, None, make_response(jsonify({'error': 'Run has no track'}), 404)
+
+    return run, track, None
+
+class TrackDetail(Resource):
+    @jwt_required()
+    def get(self, run_id):
+        run, track, error = get_track(run_id)
+        if error:
+            return error
+
+        unit = request.args.get('unit')
+        if unit not in {None, 'km', 'mile'}:
+            return make_response(jsonify({'error': 'Unit must be km or mile'}), 400)
+        metric = run.metric if unit is None else unit == 'km'
+
+        def build():
+            data = Serializer().track(track)
+            data['splits'] = tracks.splits(track, metric)
+            return jsonify({'track': data})
+
+        return respond(Validators('track', track.id, track.updated, metric), build)
+
+    @jwt_required()
+    def put(self, run_id):
+        run = models.Run.query.filter_by(id=run_id).first()
+        if run is None:
+            return make_response(jsonify({'error': 'Run does not exist'}), 404)
+
+        if run.user_id != current_identity.id:
+            return make_response(jsonify({'error': 'You are not authorized to update this record'}), 403)
+
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                return make_response(jsonify({'error': 'Must supply file'}), 400)
+            stream, name, mimetype = upload.stream, upload.filename, upload.mimetype
+        else:
+            stream, name, mimetype = request.stream, None, request.mimetype
+
+        track_format = request.args.get('format') or tracks.detect_format(name, mimetype)
+        if track_format not in tracks.TRACK_FORMATS:
+            return make_response(jsonify({'error': 'Format must be gpx, tcx or fit'}), 400)
+
+        track = models.Track.query.filter_by(run_id=run_id).first() or models.Track(run_id=run_id)
+        try:
+            tracks.build_track(track, tracks.TRACK_FORMATS[track_format](stream))
+        except tracks.TrackError as e:
+            return make_response(jsonify({'error': str(e)}), 400)
+        except ImportError:
+            return make_response(jsonify({'error': 'FIT uploads are not supported'}), 400)
+
+        try:
+            db.session.add(track)
+            db.session.commit()
+        except:
+            return make_response(jsonify({'error': 'Unable to save track'}), 500)
+
+        return jsonify({'track': Serializer().track(track)})
+
+    @jwt_required()
+    def delete(self, run_id):
+        run, track, error = get_track(run_id)
+        if error:
+            return error
+
+        if run.user_id != current_identity.id:
+            return make_response(jsonify({'error': 'You are not authorized to update this record'}), 403)
+
+        try:
+            db.session.delete(track)
+            db.session.commit()
+        except:
+            return make_response(jsonify({'error': 'Unable to delete track'}), 500)
+
+        return jsonify({'message': 'Successfully deleted track'})
+
+class TrackPolyline(Resource):
+    @jwt_required()
+    def get(self, run_id):
+        try:
+            tolerance = float(request.args.get('tolerance', TRACK_DEFAULT_TOLERANCE))
+        except ValueError:
+            tolerance = None
+        if tolerance is None or not TRACK_MIN_TOLERANCE <= tolerance <= TRACK_MAX_TOLERANCE:
+            return make_response(jsonify({'error': 'Tolerance must be between {} and {} meters'.format(
+                TRACK_MIN_TOLERANCE, TRACK_MAX_TOLERANCE)}), 400)
+
+        run, track, error = get_track(run_id)
+        if error:
+            return error
+
+        def build():
+            line, points = tracks.polyline(track, tolerance)
+            return jsonify({'run_id': run_id, 'tolerance': tolerance, 'points': points, 'polyline': line})
+
+        return respond(Validators('trackpolyline', track.id, track.updated, tolerance), build)
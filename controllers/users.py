@@ -1,18 +1,38 @@
-from flask import jsonify, request, make_response
+from datetime import datetime
+from flask import request, make_response, Response, stream_with_context
 from flask_restful import Resource
 from flask_jwt import jwt_required, current_identity
 from application import db, models
 from sqlalchemy.exc import IntegrityError
 from helpers import parse_int, parse_bool
-from constants import MAX_PAGE_SIZE, DEFAULT_PAGE, DEFAULT_PAGE_SIZE
+from serializers import jsonify, Serializer, Projection, user_options
+from auth import invalidate_identity
+from passwords import PasswordHasherBusy
+import exports
+import jobs
+import stats
+import records
+from search import UserSearchPage
+from pagination import filter_date_range, run_page, parse_page_size
+from responses import cached
+from conditional import Validators, aggregate, respond, precondition_failed, user_validators
+from constants import MAX_PAGE_SIZE, DEFAULT_PAGE, DEFAULT_PAGE_SIZE, SUMMARY_PERIODS
 
 class UserList(Resource):
     @jwt_required()
     def get(self):
+        projection, error = Projection.from_request('user')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
         page = parse_int(request.args.get('page')) or DEFAULT_PAGE
         page_size = parse_int(request.args.get('page_size')) or DEFAULT_PAGE_SIZE
         search = request.args.get('search')
 
+        if page < 1:
+            page = DEFAULT_PAGE
+        if page_size < 1:
+            page_size = DEFAULT_PAGE_SIZE
         if page_size > MAX_PAGE_SIZE:
             page_size = MAX_PAGE_SIZE
 
@@ -22,14 +42,44 @@ class UserList(Resource):
             if len(search) > 1:
                 first_name = search[0]
                 last_name = search[1]
-                users = models.User.query.filter_by(first_name=first_name, last_name=last_name).order_by('last_name').paginate(page, page_size, False).items
+                users = models.User.query.filter_by(first_name=first_name, last_name=last_name)
             else:
                 first_name = search[0]
-                users = models.User.query.filter_by(first_name=first_name).order_by('last_name').paginate(page, page_size, False).items
+                users = models.User.query.filter_by(first_name=first_name)
         else:
-            users = models.User.query.order_by('last_name').paginate(page, page_size, False).items
-        users = [user.serialize() for user in users]
-        return jsonify({'users': users})
+            users = models.User.query
+
+        # The page itself is the validator, so a request costs one query whether or not it is a 304.
+        page_users = users.options(*user_options(projection=projection)).order_by('last_name') \
+            .limit(page_size).offset((page - 1) * page_size).all()
+        validators = Validators(
+            'users', request.query_string, *[part for user in page_users for part in (user.id, user.updated)],
+            collection=True
+        )
+
+        def build():
+            serializer = Serializer(projection)
+            return jsonify({'users': [serializer.user(user) for user in page_users]})
+
+        return respond(validators, build)
+
+class UserSearch(Resource):
+    @jwt_required()
+    def get(self):
+        projection, error = Projection.from_request('user')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        term = (request.args.get('q') or '').strip()
+        if not term:
+            return make_response(jsonify({'error': 'Must supply search term'}), 400)
+
+        page = UserSearchPage(term, request.args.get('cursor'), parse_page_size(request.args.get('page_size')))
+        if not page.valid:
+            return make_response(jsonify({'error': 'Invalid cursor'}), 400)
+
+        serializer = Serializer(projection)
+        return jsonify({'users': [serializer.user(user) for user in page.items], 'next_cursor': page.next_cursor})
 
 class Register(Resource):
     def post(self):
@@ -50,7 +100,10 @@ class Register(Resource):
         if models.User.query.filter_by(email=request.form.get('email')).first():
             return make_response(jsonify({'error': 'That email address is already in use'}), 400)
 
-        user.hash_password()
+        try:
+            user.hash_password()
+        except PasswordHasherBusy:
+            return make_response(jsonify({'error': 'Server busy, try again shortly'}), 503)
         
         try:
             db.session.add(user)
@@ -66,14 +119,98 @@ class Register(Resource):
 class UserDetail(Resource):
     @jwt_required()
     def get(self, user_id):
+        return cached([('user', user_id)], lambda: self.render(user_id))
+
+    def render(self, user_id):
+        projection, error = Projection.from_request('user')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
         user = models.User.query.filter_by(id=user_id).first()
 
         if user is None:
             return make_response(jsonify({'error': 'User does not exist'}), 404)
         
-        return jsonify({'user': user.serialize()})
+        return respond(user_validators(user), lambda: jsonify({'user': Serializer(projection).user(user)}))
 
 class UserRuns(Resource):
+    @jwt_required()
+    def get(self, user_id):
+        return cached([('user', user_id), ('user_runs', user_id)], lambda: self.render(user_id))
+
+    def render(self, user_id):
+        projection, error = Projection.from_request('user')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        user = models.User.query.filter_by(id=user_id).first()
+
+        if user is None:
+            return make_response(jsonify({'error': 'User does not exist'}), 404)
+
+        runs = models.Run.query.filter_by(user_id=user_id)
+
+        runs, error = filter_date_range(runs, models.Run.run_date)
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        validators = Validators('userruns', user.id, user.updated, request.query_string, *aggregate(runs, models.Run), collection=True)
+
+        def build():
+            # Each run's user is the one loaded above, so only the run columns need projecting.
+            page = run_page(runs.options(*projection.columns('run')))
+            if not page.valid:
+                return make_response(jsonify({'error': 'Invalid cursor'}), 400)
+
+            serializer = Serializer(projection)
+            data = dict(serializer.user(user))
+            data['runs'] = [serializer.run(run) for run in page.items]
+            return jsonify({'user': data, 'next_cursor': page.next_cursor})
+
+        return respond(validators, build)
+
+class UserStats(Resource):
+    @jwt_required()
+    def get(self, user_id):
+        user = models.User.query.filter_by(id=user_id).first()
+
+        if user is None:
+            return make_response(jsonify({'error': 'User does not exist'}), 404)
+
+        summaries = stats.user_summaries(user_id)
+
+        summaries, error = filter_date_range(summaries, models.RunSummary.period_start)
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
+        # Summaries change exactly when the user's runs do.
+        runs = models.Run.query.filter_by(user_id=user_id)
+        validators = Validators('stats', user.id, request.query_string, *aggregate(runs, models.Run), collection=True)
+
+        def build():
+            data = {period: [] for period in SUMMARY_PERIODS}
+            serializer = Serializer()
+            for summary in summaries:
+                data[summary.period].append(serializer.summary(summary))
+
+            return jsonify({'stats': data, 'distance_unit': 'meters', 'duration_unit': 'seconds'})
+
+        return respond(validators, build)
+
+    @jwt_required()
+    def post(self, user_id):
+        if user_id != current_identity.id:
+            return make_response(jsonify({'error': 'You are not authorized to rebuild these stats'}), 403)
+
+        job = jobs.enqueue('backfill_stats', {'user_id': user_id}, current_identity.id)
+        try:
+            db.session.commit()
+        except:
+            return make_response(jsonify({'error': 'Unable to queue stats rebuild'}), 500)
+
+        return make_response(jsonify({'job': Serializer().job(job)}), 202, {'Location': '/api/jobs/{}'.format(job.id)})
+
+class UserRecords(Resource):
     @jwt_required()
     def get(self, user_id):
         user = models.User.query.filter_by(id=user_id).first()
@@ -81,17 +218,36 @@ class UserRuns(Resource):
         if user is None:
             return make_response(jsonify({'error': 'User does not exist'}), 404)
 
-        return jsonify({'user': user.serialize(include_runs=True)})
+        held = records.user_records(user_id).all()
+        validators = Validators('records', user.id, *[part for record in held for part in (record.record, record.run_id, record.updated)], collection=True)
+
+        def build():
+            serializer = Serializer()
+            return jsonify({
+                'records': {record.record: serializer.record(record) for record in held},
+                'distance_unit': 'meters',
+                'duration_unit': 'seconds'
+            })
+
+        return respond(validators, build)
 
 class Profile(Resource):
     @jwt_required()
     def get(self):
+        projection, error = Projection.from_request('user')
+        if error:
+            return make_response(jsonify({'error': error}), 400)
+
         user = current_identity
-        return jsonify({'user': user})
+        return respond(user_validators(user), lambda: jsonify({'user': Serializer(projection).user(user)}))
 
     @jwt_required()
     def put(self):
         user = current_identity
+
+        failed = precondition_failed(user_validators(user))
+        if failed:
+            return failed
         
         if 'email' in request.form:
             if models.User.query.filter_by(email=request.form['email']).first():
@@ -110,21 +266,61 @@ class Profile(Resource):
         if error:
             return make_response(jsonify({'error': error}), 400)
 
+        if 'password' in request.form:
+            try:
+                user.hash_password()
+            except PasswordHasherBusy:
+                return make_response(jsonify({'error': 'Server busy, try again shortly'}), 503)
+
         try:
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to update profile'}), 500)
         
+        invalidate_identity(user.id)
+
         return jsonify({'user': user.serialize()})
     
     @jwt_required()
     def delete(self):
         user = current_identity
+
+        failed = precondition_failed(user_validators(user))
+        if failed:
+            return failed
+
         user.is_active = False
+        user.deactivated = datetime.utcnow()
 
         try:
             db.session.commit()
         except:
             return make_response(jsonify({'error': 'Unable to inactivate user'}), 500)
 
-        return jsonify({'message': 'User inactivated'})
\ No newline at end of file
+        invalidate_identity(user.id)
+
+        return jsonify({'message': 'User inactivated'})
+
+class ProfileExport(Resource):
+    @jwt_required()
+    def get(self):
+        export_format = request.args.get('format', 'ndjson')
+        compress = parse_bool(request.args.get('gzip', 'false'))
+
+        if export_format not in exports.EXPORT_FORMATS:
+            return make_response(jsonify({'error': 'Format must be ndjson or csv'}), 400)
+
+        if compress is None:
+            return make_response(jsonify({'error': 'Invalid gzip value'}), 400)
+
+        mimetype, extension = exports.EXPORT_FORMATS[export_format]
+        filename = 'runs.{}'.format(extension)
+        if compress:
+            mimetype, filename = 'application/gzip', filename + '.gz'
+
+        lines = exports.export_lines(current_identity.id, export_format, compress)
+        return Response(
+            stream_with_context(lines),
+            mimetype=mimetype,
+            headers={'Content-Disposition': 'attachment; filename={}'.format(filename)}
+        )
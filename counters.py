@@ -0,0 +1,98 @@
+from sqlalchemy import select, func, or_
+from application import db
+import models
+from auth import invalidate_identity
+from responses import touch
+from constants import RECONCILE_BATCH_SIZE
+
+users = models.User.__table__
+runs = models.Run.__table__
+intervals = models.Interval.__table__
+comments = models.RunComment.__table__
+
+# Counters are updated with UPDATE ... SET count = count + delta in the
+# caller's transaction, so concurrent writers never lose an increment. The
+# columns' onupdate also moves `updated`, which keeps ETags and
+# Last-Modified in step with the counts.
+
+def change_comment_count(run_id, delta):
+    db.session.execute(runs.update().where(runs.c.id == run_id).values(comment_count=runs.c.comment_count + delta))
+    touch(('run', run_id))
+
+def change_interval_count(run_id, delta):
+    if delta:
+        db.session.execute(runs.update().where(runs.c.id == run_id).values(interval_count=runs.c.interval_count + delta))
+        touch(('run', run_id))
+
+def latest_run_date(user_id):
+    return select([func.max(runs.c.run_date)]).where(runs.c.user_id == user_id).as_scalar()
+
+def add_runs(user_id, count, last_run_date):
+    """Counts new runs towards a user; last_run_date is the latest of their dates."""
+    db.session.execute(users.update().where(users.c.id == user_id).values(
+        run_count=users.c.run_count + count,
+        # GREATEST ignores NULL, so a user's first run sets it.
+        last_run_date=func.greatest(users.c.last_run_date, last_run_date)
+    ))
+    touch(('user', user_id))
+
+def remove_runs(user_id, count):
+    """Uncounts deleted runs. Call after the delete is flushed, as last_run_date is read back from runs."""
+    db.session.execute(users.update().where(users.c.id == user_id).values(
+        run_count=users.c.run_count - count,
+        last_run_date=latest_run_date(user_id)
+    ))
+    touch(('user', user_id))
+
+def refresh_last_run_date(user_id):
+    db.session.execute(users.update().where(users.c.id == user_id).values(last_run_date=latest_run_date(user_id)))
+    touch(('user', user_id))
+
+def id_batches(table, batch_size):
+    low, high = db.session.query(func.min(table.c.id), func.max(table.c.id)).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, batch_size):
+        yield start, start + batch_size - 1
+
+def reconcile_runs(batch_size=RECONCILE_BATCH_SIZE):
+    """Recounts comments and intervals, one id range per transaction. Returns the number of runs fixed."""
+    comment_count = select([func.count()]).where(comments.c.run_id == runs.c.id).as_scalar()
+    interval_count = select([func.count()]).where(intervals.c.run_id == runs.c.id).as_scalar()
+
+    fixed = 0
+    for start, end in id_batches(runs, batch_size):
+        result = db.session.execute(
+            runs.update()
+                .where(runs.c.id.between(start, end))
+                .where(or_(runs.c.comment_count != comment_count, runs.c.interval_count != interval_count))
+                .values(comment_count=comment_count, interval_count=interval_count)
+                .returning(runs.c.id)
+        )
+        run_ids = [row[0] for row in result]
+        touch(*(('run', run_id) for run_id in run_ids))
+        db.session.commit()
+        fixed += len(run_ids)
+    return fixed
+
+def reconcile_users(batch_size=RECONCILE_BATCH_SIZE):
+    """Recounts runs and last run dates, one id range per transaction. Returns the number of users fixed."""
+    run_count = select([func.count()]).where(runs.c.user_id == users.c.id).as_scalar()
+    last_run_date = select([func.max(runs.c.run_date)]).where(runs.c.user_id == users.c.id).as_scalar()
+
+    fixed = 0
+    for start, end in id_batches(users, batch_size):
+        result = db.session.execute(
+            users.update()
+                .where(users.c.id.between(start, end))
+                .where(or_(users.c.run_count != run_count, users.c.last_run_date.is_distinct_from(last_run_date)))
+                .values(run_count=run_count, last_run_date=last_run_date)
+                .returning(users.c.id)
+        )
+        user_ids = [row[0] for row in result]
+        touch(*(('user', user_id) for user_id in user_ids))
+        db.session.commit()
+        for user_id in user_ids:
+            invalidate_identity(user_id)
+        fixed += len(user_ids)
+    return fixed
@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+import zlib
+import models
+from helpers import format_datetime
+from constants import EXPORT_CHUNK_SIZE
+
+CSV_FIELDS = (
+    'record_type', 'id', 'run_id', 'user_id', 'run_date', 'distance', 'duration', 'metric',
+    'warmup', 'cooldown', 'run_type', 'location', 'notes', 'comment', 'created', 'updated'
+)
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv')
+}
+
+def format_date(value):
+    return format_datetime(value) if value else None
+
+def run_record(run):
+    return {
+        'id': run.id,
+        'run_date': format_date(run.run_date),
+        'distance': run.distance,
+        'duration': run.duration,
+        'metric': run.metric,
+        'warmup': run.warmup,
+        'cooldown': run.cooldown,
+        'run_type': run.run_type,
+        'location': run.location,
+        'notes': run.notes,
+        'created': format_date(run.created),
+        'updated': format_date(run.updated)
+    }
+
+def interval_record(interval):
+    return {
+        'id': interval.id,
+        'run_id': interval.run_id,
+        'distance': interval.distance,
+        'duration': interval.duration,
+        'metric': interval.metric,
+        'created': format_date(interval.created),
+        'updated': format_date(interval.updated)
+    }
+
+def comment_record(comment):
+    return {
+        'id': comment.id,
+        'run_id': comment.run_id,
+        'user_id': comment.user_id,
+        'comment': comment.comment,
+        'created': format_date(comment.created),
+        'updated': format_date(comment.updated)
+    }
+
+def children_by_run(model, run_ids):
+    children = {run_id: [] for run_id in run_ids}
+    for child in model.query.filter(model.run_id.in_(run_ids)).order_by(model.id).enable_eagerloads(False):
+        children[child.run_id].append(child)
+    return children
+
+def run_chunks(user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields (run, intervals, comments) for every run of a user.
+
+    Runs come from a server-side cursor and their intervals and comments are
+    fetched one chunk of runs at a time, so memory stays bounded by the chunk
+    size rather than the size of the history.
+    """
+    runs = models.Run.query.filter_by(user_id=user_id).order_by(models.Run.id) \
+        .enable_eagerloads(False) \
+        .execution_options(stream_results=True) \
+        .yield_per(chunk_size)
+
+    chunk = []
+    for run in runs:
+        chunk.append(run)
+        if len(chunk) >= chunk_size:
+            for item in expand_chunk(chunk):
+                yield item
+            chunk = []
+
+    if chunk:
+        for item in expand_chunk(chunk):
+            yield item
+
+def expand_chunk(runs):
+    run_ids = [run.id for run in runs]
+    intervals = children_by_run(models.Interval, run_ids)
+    comments = children_by_run(models.RunComment, run_ids)
+
+    for run in runs:
+        yield run, intervals[run.id], comments[run.id]
+
+def ndjson_lines(user_id):
+    for run, intervals, comments in run_chunks(user_id):
+        record = run_record(run)
+        record['intervals'] = [interval_record(interval) for interval in intervals]
+        record['comments'] = [comment_record(comment) for comment in comments]
+        yield json.dumps(record) + '\n'
+
+def csv_lines(user_id):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction='ignore')
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writeheader()
+    yield flush()
+
+    for run, intervals, comments in run_chunks(user_id):
+        writer.writerow(dict(run_record(run), record_type='run', user_id=user_id))
+        for interval in intervals:
+            writer.writerow(dict(interval_record(interval), record_type='interval'))
+        for comment in comments:
+            writer.writerow(dict(comment_record(comment), record_type='comment'))
+        yield flush()
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_lines(user_id, export_format, compress=False):
+    lines = ndjson_lines(user_id) if export_format == 'ndjson' else csv_lines(user_id)
+    if compress:
+        return gzipped(lines)
+    return lines
@@ -0,0 +1,149 @@
+from sqlalchemy import select, union_all, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from application import db
+import models
+from pagination import encode_cursor, decode_cursor
+from serializers import run_options, FULL
+from responses import touch
+from constants import FEED_FANOUT_LIMIT, FEED_BACKFILL_RUNS
+
+follows = models.Follow.__table__
+timeline = models.TimelineEntry.__table__
+runs = models.Run.__table__
+users = models.User.__table__
+
+TIMELINE_COLUMNS = ['user_id', 'run_id', 'author_id', 'run_date']
+
+def fan_out(run_ids):
+    """Copies new runs into the timeline of every follower of their authors.
+
+    Authors with more than FEED_FANOUT_LIMIT followers are skipped; their
+    runs are read straight from the runs table when a feed is served. Runs
+    inside the caller's transaction, as one INSERT ... SELECT.
+    """
+    if not run_ids:
+        return
+
+    rows = select([follows.c.follower_id, runs.c.id, runs.c.user_id, runs.c.run_date]) \
+        .select_from(runs.join(follows, follows.c.followed_id == runs.c.user_id).join(users, users.c.id == runs.c.user_id)) \
+        .where(runs.c.id.in_(run_ids)) \
+        .where(users.c.follower_count <= FEED_FANOUT_LIMIT)
+    db.session.execute(insert(timeline).from_select(TIMELINE_COLUMNS, rows).on_conflict_do_nothing())
+
+def backfill(author_id, follower_id=None):
+    """Copies an author's most recent runs into their followers' timelines, or just one follower's."""
+    recent = select([runs.c.id, runs.c.user_id, runs.c.run_date]) \
+        .where(runs.c.user_id == author_id) \
+        .order_by(runs.c.run_date.desc()) \
+        .limit(FEED_BACKFILL_RUNS) \
+        .alias('recent')
+
+    rows = select([follows.c.follower_id, recent.c.id, recent.c.user_id, recent.c.run_date]) \
+        .select_from(recent.join(follows, follows.c.followed_id == recent.c.user_id))
+    if follower_id is not None:
+        rows = rows.where(follows.c.follower_id == follower_id)
+
+    db.session.execute(insert(timeline).from_select(TIMELINE_COLUMNS, rows).on_conflict_do_nothing())
+
+def change_follower_count(user_id, delta):
+    """Returns the new count. Callers invalidate the user's identity once they commit."""
+    result = db.session.execute(
+        users.update().where(users.c.id == user_id)
+            .values(follower_count=users.c.follower_count + delta)
+            .returning(users.c.follower_count)
+    )
+    touch(('user', user_id))
+    return result.scalar()
+
+def follow(follower_id, followed_id):
+    """Returns False if the follow already existed."""
+    result = db.session.execute(
+        insert(follows).values(follower_id=follower_id, followed_id=followed_id)
+            .on_conflict_do_nothing()
+            .returning(follows.c.id)
+    )
+    if result.scalar() is None:
+        return False
+
+    if change_follower_count(followed_id, 1) <= FEED_FANOUT_LIMIT:
+        backfill(followed_id, follower_id)
+    return True
+
+def unfollow(follower_id, followed_id):
+    """Returns False if there was nothing to unfollow."""
+    result = db.session.execute(
+        follows.delete()
+            .where(follows.c.follower_id == follower_id)
+            .where(follows.c.followed_id == followed_id)
+    )
+    if not result.rowcount:
+        return False
+
+    db.session.execute(
+        timeline.delete()
+            .where(timeline.c.user_id == follower_id)
+            .where(timeline.c.author_id == followed_id)
+    )
+
+    # Back under the limit, so fan-out on write resumes. Runs posted while
+    # over it were never copied, so copy the recent ones now.
+    if change_follower_count(followed_id, -1) == FEED_FANOUT_LIMIT:
+        backfill(followed_id)
+    return True
+
+def move_run(run):
+    db.session.execute(timeline.update().where(timeline.c.run_id == run.id).values(run_date=run.run_date))
+
+def feed_query(user_id, after=None, limit=None, projection=FULL):
+    """Runs in a user's feed, newest first, as a single statement.
+
+    Timeline rows cover authors that fan out on write; followed authors over
+    FEED_FANOUT_LIMIT are read from runs instead. Each branch is limited on
+    its own index before the two are merged, and runs come back with their
+    authors joined in.
+    """
+    fan_in = select([follows.c.followed_id]) \
+        .select_from(follows.join(users, users.c.id == follows.c.followed_id)) \
+        .where(follows.c.follower_id == user_id) \
+        .where(users.c.follower_count > FEED_FANOUT_LIMIT)
+
+    pushed = select([timeline.c.run_date, timeline.c.run_id]) \
+        .where(timeline.c.user_id == user_id) \
+        .where(~timeline.c.author_id.in_(fan_in))
+    pulled = select([runs.c.run_date, runs.c.id.label('run_id')]) \
+        .where(runs.c.user_id.in_(fan_in))
+
+    branches = []
+    for branch, date_column, id_column in ((pushed, timeline.c.run_date, timeline.c.run_id), (pulled, runs.c.run_date, runs.c.id)):
+        if after:
+            branch = branch.where(tuple_(date_column, id_column) < tuple_(*after))
+        if limit:
+            branch = branch.order_by(date_column.desc(), id_column.desc()).limit(limit)
+        branch = branch.alias()
+        branches.append(select([branch.c.run_date, branch.c.run_id]))
+
+    entries = union_all(*branches).alias('feed')
+    query = db.session.query(models.Run) \
+        .join(entries, models.Run.id == entries.c.run_id) \
+        .options(*run_options(projection=projection)) \
+        .order_by(entries.c.run_date.desc(), entries.c.run_id.desc())
+    return query.limit(limit) if limit else query
+
+class FeedPage(object):
+    def __init__(self, user_id, cursor=None, page_size=25, projection=FULL):
+        self.valid = True
+        self.items = []
+        self.next_cursor = None
+
+        after = None
+        if cursor:
+            after = decode_cursor(cursor, [models.Run.run_date, models.Run.id])
+            if after is None:
+                self.valid = False
+                return
+
+        rows = feed_query(user_id, after, page_size + 1, projection).all()
+        self.items = rows[:page_size]
+        if len(rows) > page_size:
+            last = self.items[-1]
+            self.next_cursor = encode_cursor([last.run_date, last.id])
@@ -1,4 +1,4 @@
-from constants import ISO_FORMAT
+from constants import ISO_FORMAT, METERS_PER_YARD
 from datetime import datetime
 
 def parse_int(x):
@@ -15,6 +15,10 @@ def parse_date(x):
         x = None
     return x
 
+def format_datetime(x):
+    # Same output as strftime(ISO_FORMAT) for the naive UTC datetimes we store, at a fraction of the cost.
+    return x.isoformat(timespec='seconds') + 'Z'
+
 def parse_bool(x):
     if x in {True, 'true'}:
         return True
@@ -22,4 +26,13 @@ def parse_bool(x):
     if x in {False, 'false'}:
         return False
     
-    return None
\ No newline at end of file
+    return None
+
+def to_meters(distance, metric):
+    if distance is None:
+        return 0.0
+
+    if metric:
+        return float(distance)
+
+    return distance * METERS_PER_YARD
@@ -0,0 +1,226 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from application import db
+import models
+import stats
+import feed
+import records
+import responses
+import counters
+from auth import invalidate_identity
+from helpers import parse_date, parse_int, parse_bool
+from constants import IMPORT_BATCH_SIZE, MAX_IMPORT_ERRORS
+
+RUN_FIELDS = ('user_id', 'run_date', 'distance', 'duration', 'metric', 'warmup', 'cooldown', 'run_type', 'location', 'notes', 'interval_count', 'created', 'updated')
+INTERVAL_FIELDS = ('run_id', 'distance', 'duration', 'metric', 'created', 'updated')
+
+# Yielded for lines that do not parse, so no JSON value can be mistaken for one.
+INVALID_JSON = object()
+
+def text_stream(stream):
+    return codecs.getreader('utf-8')(stream)
+
+def ndjson_rows(stream):
+    # Blank lines yield None so row numbers keep matching line numbers.
+    for line in text_stream(stream):
+        line = line.strip()
+        if not line:
+            yield None
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield INVALID_JSON
+
+def csv_rows(stream):
+    for row in csv.DictReader(text_stream(stream)):
+        yield {key: value for key, value in row.items() if key is not None and value not in ('', None)}
+
+IMPORT_FORMATS = {
+    'ndjson': ndjson_rows,
+    'csv': csv_rows
+}
+
+def detect_format(name, mimetype):
+    name = (name or '').lower()
+    if name.endswith('.csv') or mimetype == 'text/csv':
+        return 'csv'
+    if name.endswith('.ndjson') or name.endswith('.jsonl') or mimetype in {'application/x-ndjson', 'application/ndjson'}:
+        return 'ndjson'
+
+def build_run(row, user):
+    """Builds and validates a Run and its Intervals from one uploaded row.
+
+    Values are parsed the same way as the RunList.post and IntervalList.post
+    form fields. Returns (run, intervals, error).
+    """
+    if row is INVALID_JSON:
+        return None, None, 'Invalid JSON'
+    if not isinstance(row, dict):
+        return None, None, 'Row must be a JSON object'
+
+    metric = parse_bool(row.get('metric', user.metric))
+    run = models.Run(
+        user_id=user.id,
+        run_date=parse_date(row.get('run_date')),
+        distance=parse_int(row.get('distance')),
+        duration=parse_int(row.get('duration')),
+        metric=metric,
+        warmup=parse_int(row.get('warmup')),
+        cooldown=parse_int(row.get('cooldown')),
+        run_type=row.get('run_type'),
+        location=row.get('location'),
+        notes=row.get('notes')
+    )
+
+    error = run.validate()
+    if error:
+        return None, None, error
+
+    intervals, error = build_intervals(row.get('intervals') or [], metric)
+    if error:
+        return None, None, error
+
+    return run, intervals, None
+
+def build_intervals(items, metric):
+    """Builds and validates Intervals from a list of dicts. Returns (intervals, error)."""
+    intervals = []
+    for data in items:
+        if not isinstance(data, dict):
+            return None, 'Invalid interval'
+
+        interval = models.Interval(
+            distance=parse_int(data.get('distance')),
+            duration=parse_int(data.get('duration')),
+            metric=parse_bool(data.get('metric', metric))
+        )
+
+        error = interval.validate()
+        if error:
+            return None, 'Interval: {}'.format(error)
+
+        intervals.append(interval)
+
+    return intervals, None
+
+def insert_intervals(pairs, now=None):
+    """Inserts (interval, run) pairs as one multi-row INSERT ... RETURNING id and sets their ids."""
+    if not pairs:
+        return
+
+    now = now or datetime.utcnow()
+    rows = []
+    for interval, run in pairs:
+        interval.run_id = run.id
+        interval.created = interval.updated = now
+        rows.append({field: getattr(interval, field) for field in INTERVAL_FIELDS})
+
+    table = models.Interval.__table__
+    ids = db.session.execute(table.insert().values(rows).returning(table.c.id))
+    for (interval, run), row in zip(pairs, ids):
+        interval.id = row[0]
+
+    responses.touch(*{('run', run.id) for interval, run in pairs})
+
+def insert_batch(batch):
+    """Inserts a batch of (run, intervals) pairs in one transaction.
+
+    Runs and intervals each go in as a single multi-row INSERT ... RETURNING
+    id, instead of one ORM flush per object.
+    """
+    now = datetime.utcnow()
+    runs = models.Run.__table__
+
+    rows = []
+    for run, intervals in batch:
+        run.created = run.updated = now
+        run.interval_count = len(intervals)
+        rows.append({field: getattr(run, field) for field in RUN_FIELDS})
+
+    ids = [row[0] for row in db.session.execute(runs.insert().values(rows).returning(runs.c.id))]
+
+    all_intervals = []
+    for run_id, (run, intervals) in zip(ids, batch):
+        run.id = run_id
+        all_intervals.extend((interval, run) for interval in intervals)
+
+    insert_intervals(all_intervals, now)
+    responses.touch(*{('user_runs', run.user_id) for run, intervals in batch})
+
+    stats.apply_contributions([stats.contribution(run) for run, intervals in batch], 1)
+    feed.fan_out(ids)
+    records.offer(
+        [records.run_effort(run) for run, intervals in batch] +
+        [records.interval_effort(interval, run) for interval, run in all_intervals]
+    )
+
+    user_ids = {run.user_id for run, intervals in batch}
+    for user_id in user_ids:
+        dates = [run.run_date for run, intervals in batch if run.user_id == user_id]
+        counters.add_runs(user_id, len(dates), max(dates))
+    db.session.commit()
+
+    for user_id in user_ids:
+        invalidate_identity(user_id)
+
+class ImportReport(object):
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+    def serialize(self):
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+def import_runs(rows, user, batch_size=IMPORT_BATCH_SIZE):
+    """Validates and inserts rows as they are read, holding at most one batch in memory.
+
+    Each batch is committed on its own, so a failing batch only loses its own
+    rows and is reported against every row in it.
+    """
+    report = ImportReport()
+    batch = []
+    row_numbers = []
+
+    def flush():
+        try:
+            insert_batch(batch)
+            report.imported += len(batch)
+        except Exception:
+            db.session.rollback()
+            for row_number in row_numbers:
+                report.error(row_number, 'Unable to save run')
+        del batch[:]
+        del row_numbers[:]
+
+    for row_number, row in enumerate(rows, start=1):
+        if row is None:
+            continue
+
+        run, intervals, error = build_run(row, user)
+        if error:
+            report.error(row_number, error)
+            continue
+
+        batch.append((run, intervals))
+        row_numbers.append(row_number)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    return report
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import Histogram, render_histogram
+
+logger = logging.getLogger('runnerapp.slow_requests')
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+MAX_LOGGED_STATEMENTS = 50
+
+class RequestStats(object):
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.statements = []
+
+class EndpointStats(object):
+    def __init__(self):
+        self.latency = Histogram()
+        self.sql_time = Histogram()
+        self.sql_count = Histogram(QUERY_COUNT_BUCKETS)
+        self.serialize_time = Histogram()
+
+class Registry(object):
+    """Per (endpoint, method) histograms, shared by every request in the process."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def get(self, endpoint, method):
+        key = (endpoint, method)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            with self.lock:
+                stats = self.endpoints.setdefault(key, EndpointStats())
+        return stats
+
+    def render(self):
+        lines = []
+        for name, attribute in (
+            ('http_request_duration_seconds', 'latency'),
+            ('http_request_sql_duration_seconds', 'sql_time'),
+            ('http_request_sql_queries', 'sql_count'),
+            ('http_request_serialize_duration_seconds', 'serialize_time')
+        ):
+            lines.append('# TYPE {} histogram'.format(name))
+            for (endpoint, method), stats in sorted(self.endpoints.items()):
+                lines.extend(render_histogram(name, {'endpoint': endpoint, 'method': method}, getattr(stats, attribute)))
+        return lines
+
+registry = Registry()
+
+def current_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+def record_serialize(elapsed):
+    stats = current_stats()
+    if stats is not None:
+        stats.serialize_time += elapsed
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    stats = current_stats()
+    if stats is None:
+        return
+
+    stats.sql_count += 1
+    stats.sql_time += elapsed
+    if len(stats.statements) < MAX_LOGGED_STATEMENTS:
+        stats.statements.append((elapsed, statement))
+
+def handle_error(context):
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def before_request():
+    g.request_stats = RequestStats()
+
+def after_request(response):
+    stats = g.pop('request_stats', None)
+    if stats is None or request.endpoint is None:
+        return response
+
+    elapsed = time.perf_counter() - stats.start
+    endpoint = registry.get(request.endpoint, request.method)
+    endpoint.latency.observe(elapsed)
+    endpoint.sql_time.observe(stats.sql_time)
+    endpoint.sql_count.observe(stats.sql_count)
+    endpoint.serialize_time.observe(stats.serialize_time)
+
+    threshold = current_app.config.get('SLOW_REQUEST_SECONDS')
+    if threshold is not None and elapsed >= threshold:
+        logger.warning(
+            'Slow request %s %s (%s): %.3fs total, %d queries in %.3fs, %.3fs serializing\n%s',
+            request.method, request.path, request.endpoint, elapsed, stats.sql_count, stats.sql_time, stats.serialize_time,
+            '\n'.join('  {:.4f}s {}'.format(duration, statement) for duration, statement in stats.statements)
+        )
+
+    return response
+
+def init_instrumentation(app):
+    # Listening on Engine covers the primary and every replica bind.
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+
+    app.before_request(before_request)
+    app.after_request(after_request)
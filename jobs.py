@@ -0,0 +1,187 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+from application import db
+import models
+import stats
+import records
+import imports
+import uploads
+import purge
+from constants import JOB_MAX_ATTEMPTS, JOB_BACKOFF_SECONDS, JOB_MAX_BACKOFF_SECONDS, JOB_LOCK_TIMEOUT_SECONDS, JOB_POLL_SECONDS, JOB_HEARTBEAT_SECONDS, PURGE_BATCH_SIZE
+
+logger = logging.getLogger('runnerapp.jobs')
+
+jobs = models.Job.__table__
+
+HANDLERS = {}
+
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+def enqueue(kind, payload=None, user_id=None, max_attempts=JOB_MAX_ATTEMPTS):
+    """Adds a job to the caller's transaction; it becomes visible to workers on commit."""
+    if kind not in HANDLERS:
+        raise ValueError('Unknown job kind {}'.format(kind))
+
+    job = models.Job(kind=kind, payload=payload or {}, user_id=user_id, max_attempts=max_attempts, run_at=datetime.utcnow())
+    db.session.add(job)
+    return job
+
+def backoff(attempts):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(JOB_MAX_BACKOFF_SECONDS, JOB_BACKOFF_SECONDS * 2 ** (attempts - 1)))
+
+def fail_abandoned(now):
+    """Fails jobs whose worker died on their last attempt, rather than running them again."""
+    db.session.execute(
+        jobs.update()
+            .where(jobs.c.status == 'running')
+            .where(jobs.c.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS))
+            .where(jobs.c.attempts >= jobs.c.max_attempts)
+            .values(status='failed', last_error='Worker stopped responding', locked_at=None, locked_by=None)
+    )
+
+def claim(worker_id):
+    """Locks the next runnable job for this worker, or returns None.
+
+    FOR UPDATE SKIP LOCKED lets any number of workers poll the same table
+    without blocking on, or double-claiming, each other's rows. A running
+    job's worker refreshes locked_at every JOB_HEARTBEAT_SECONDS, so one not
+    refreshed for JOB_LOCK_TIMEOUT_SECONDS has lost its worker and is claimed
+    again, unless that was its last attempt.
+    """
+    now = datetime.utcnow()
+    fail_abandoned(now)
+    job = models.Job.query \
+        .filter(or_(
+            and_(models.Job.status == 'queued', models.Job.run_at <= now),
+            and_(
+                models.Job.status == 'running',
+                models.Job.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS),
+                models.Job.attempts < models.Job.max_attempts
+            )
+        )) \
+        .order_by(models.Job.run_at) \
+        .with_for_update(skip_locked=True) \
+        .first()
+
+    if job is None:
+        db.session.commit()
+        return None
+
+    job.status = 'running'
+    job.attempts += 1
+    job.locked_at = now
+    job.locked_by = worker_id
+    db.session.commit()
+    return job
+
+class Heartbeat(threading.Thread):
+    """Refreshes a running job's locked_at until stopped, on a connection of its own."""
+
+    def __init__(self, engine, job_id, worker_id, interval=JOB_HEARTBEAT_SECONDS):
+        super(Heartbeat, self).__init__(name='heartbeat-{}'.format(job_id), daemon=True)
+        self.engine = engine
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        jobs.update()
+                            .where(jobs.c.id == self.job_id)
+                            .where(jobs.c.locked_by == self.worker_id)
+                            .values(locked_at=datetime.utcnow())
+                    )
+            except Exception:
+                logger.exception('Heartbeat for job %s failed', self.job_id)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+def finish(job_id, **values):
+    models.Job.query.filter_by(id=job_id).update(dict(values, locked_at=None, locked_by=None, updated=datetime.utcnow()), synchronize_session=False)
+    db.session.commit()
+
+def run_one(worker_id):
+    """Claims and runs one job. Returns False when there was nothing to do."""
+    job = claim(worker_id)
+    if job is None:
+        return False
+
+    job_id, kind, attempts, max_attempts = job.id, job.kind, job.attempts, job.max_attempts
+    start = time.perf_counter()
+    heartbeat = Heartbeat(db.engine, job_id, worker_id)
+    heartbeat.start()
+    try:
+        result = HANDLERS[kind](job)
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+        if attempts < max_attempts:
+            delay = backoff(attempts)
+            logger.warning('Job %s (%s) failed, attempt %d of %d, retrying in %.0fs', job_id, kind, attempts, max_attempts, delay)
+            finish(job_id, status='queued', last_error=error, run_at=datetime.utcnow() + timedelta(seconds=delay))
+        else:
+            logger.error('Job %s (%s) failed permanently after %d attempts\n%s', job_id, kind, attempts, error)
+            finish(job_id, status='failed', last_error=error)
+        return True
+    finally:
+        heartbeat.stop()
+
+    finish(job_id, status='succeeded', result=result)
+    logger.info('Job %s (%s) succeeded in %.3fs', job_id, kind, time.perf_counter() - start)
+    return True
+
+def work(burst=False, poll=JOB_POLL_SECONDS):
+    """Runs jobs until interrupted, or with burst=True until the queue is empty."""
+    worker_id = '{}:{}'.format(socket.gethostname(), os.getpid())
+    while True:
+        if run_one(worker_id):
+            continue
+        if burst:
+            return
+        time.sleep(poll)
+
+@handler('backfill_stats')
+def backfill_stats(job):
+    stats.backfill(job.payload.get('user_id'))
+    return {'user_id': job.payload.get('user_id')}
+
+@handler('backfill_records')
+def backfill_records(job):
+    records.backfill(job.payload.get('user_id'))
+    return {'user_id': job.payload.get('user_id')}
+
+@handler('purge_users')
+def purge_users(job):
+    return {'user_ids': purge.purge(job.payload.get('user_id'), job.payload.get('batch_size') or PURGE_BATCH_SIZE)}
+
+@handler('import_runs')
+def import_runs(job):
+    upload_id = job.payload['upload_id']
+    try:
+        user = models.User.query.filter_by(id=job.user_id).one()
+        rows = imports.IMPORT_FORMATS[job.payload['format']](uploads.open_upload(upload_id))
+        report = imports.import_runs(rows, user)
+    finally:
+        # Imports are never retried, so the upload is not needed again.
+        db.session.rollback()
+        uploads.delete(upload_id)
+        db.session.commit()
+    return report.serialize()
@@ -1,4 +1,5 @@
 import os
+import sys
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 from application import app, db
@@ -10,5 +11,90 @@ manager = Manager(app)
 
 manager.add_command('db', MigrateCommand)
 
+@manager.option('-r', '--min-rows', dest='min_rows', type=int, default=None, help='Only fail on tables with at least this many rows')
+def explain(min_rows=None):
+    """Fail if any endpoint query plans a sequential scan on a large table"""
+    import queryplans
+
+    failures = queryplans.check_plans(min_rows or queryplans.LARGE_TABLE_ROWS)
+    for endpoint, table in failures:
+        print('{}: sequential scan on {}'.format(endpoint, table))
+
+    if failures:
+        sys.exit(1)
+
+    print('No sequential scans on large tables')
+
+@manager.option('-u', '--user', dest='user_id', type=int, default=None, help='Only rebuild this user')
+def backfill_stats(user_id=None):
+    """Rebuild weekly, monthly and yearly run summaries from the runs table"""
+    import stats
+
+    stats.backfill(user_id)
+    print('Rebuilt run summaries')
+
+@manager.option('-u', '--user', dest='user_id', type=int, default=None, help='Only rebuild this user')
+@manager.option('-q', '--queue', dest='queue', action='store_true', default=False, help='Queue the rebuild for a worker instead')
+def backfill_records(user_id=None, queue=False):
+    """Rebuild personal records from the runs and intervals tables"""
+    if queue:
+        import jobs
+
+        job = jobs.enqueue('backfill_records', {'user_id': user_id})
+        db.session.commit()
+        print('Queued job {}'.format(job.id))
+        return
+
+    import records
+
+    records.backfill(user_id)
+    print('Rebuilt personal records')
+
+@manager.option('-s', '--batch-size', dest='batch_size', type=int, default=None, help='Rows per transaction')
+def reconcile(batch_size=None):
+    """Repair drift in the run and user counter columns"""
+    import counters
+    from constants import RECONCILE_BATCH_SIZE
+
+    runs = counters.reconcile_runs(batch_size or RECONCILE_BATCH_SIZE)
+    users = counters.reconcile_users(batch_size or RECONCILE_BATCH_SIZE)
+    print('Fixed counters on {} runs and {} users'.format(runs, users))
+
+@manager.option('-u', '--user', dest='user_id', type=int, default=None, help='Only purge this inactive user')
+@manager.option('-s', '--batch-size', dest='batch_size', type=int, default=None, help='Rows per transaction')
+@manager.option('-p', '--pause', dest='pause', type=float, default=0.0, help='Seconds to wait between batches')
+@manager.option('-q', '--queue', dest='queue', action='store_true', default=False, help='Queue the purge for a worker instead')
+def purge(user_id=None, batch_size=None, pause=0.0, queue=False):
+    """Delete inactive users and everything they own, in bounded batches"""
+    if queue:
+        import jobs
+
+        job = jobs.enqueue('purge_users', {'user_id': user_id, 'batch_size': batch_size})
+        db.session.commit()
+        print('Queued job {}'.format(job.id))
+        return
+
+    import logging
+    import purge
+    from constants import PURGE_BATCH_SIZE
+
+    logging.basicConfig(level=logging.INFO)
+    user_ids = purge.purge(user_id, batch_size or PURGE_BATCH_SIZE, pause)
+    print('Purged {} users'.format(len(user_ids)))
+
+@manager.option('-b', '--burst', dest='burst', action='store_true', default=False, help='Exit once the queue is empty')
+@manager.option('-p', '--poll', dest='poll', type=float, default=None, help='Seconds to wait when the queue is empty')
+def worker(burst=False, poll=None):
+    """Run queued background jobs; start one process per worker"""
+    import logging
+    import jobs
+    from constants import JOB_POLL_SECONDS
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        jobs.work(burst=burst, poll=poll or JOB_POLL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+
 if __name__ == '__main__':
     manager.run()
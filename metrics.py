@@ -0,0 +1,63 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram(object):
+    """Thread-safe cumulative histogram of durations in seconds, Prometheus style."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def cumulative(self):
+        """[(upper bound, count of observations <= bound)], ending with +Inf."""
+        with self.lock:
+            counts = list(self.counts)
+
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def serialize(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'buckets': [[bound if bound != float('inf') else '+Inf', count] for bound, count in self.cumulative()]
+        }
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in sorted(labels.items())) + '}'
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+def render_histogram(name, labels, histogram):
+    """Prometheus text exposition lines for one labelled histogram."""
+    lines = []
+    for bound, count in histogram.cumulative():
+        lines.append('{}_bucket{} {}'.format(name, format_labels(dict(labels, le=format_bound(bound))), count))
+    lines.append('{}_sum{} {}'.format(name, format_labels(labels), histogram.sum))
+    lines.append('{}_count{} {}'.format(name, format_labels(labels), histogram.count))
+    return lines
+
+def render_value(name, labels, value):
+    return '{}{} {}'.format(name, format_labels(labels), value)
@@ -0,0 +1,37 @@
+"""run summaries
+
+Revision ID: 0f5b7e21c9a4
+Revises: 6d0e8b4f2c57
+Create Date: 2026-10-18 11:20:05.317902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0f5b7e21c9a4'
+down_revision = '6d0e8b4f2c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('run_summaries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=5), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('run_count', sa.Integer(), nullable=False),
+    sa.Column('distance', sa.Float(), nullable=False),
+    sa.Column('duration', sa.Integer(), nullable=False),
+    sa.Column('warmup', sa.Float(), nullable=False),
+    sa.Column('cooldown', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'period', 'period_start')
+    )
+
+
+def downgrade():
+    op.drop_table('run_summaries')
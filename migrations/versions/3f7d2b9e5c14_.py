@@ -0,0 +1,46 @@
+"""tracks
+
+Revision ID: 3f7d2b9e5c14
+Revises: 92b6e4c1a0f3
+Create Date: 2026-10-18 19:12:07.318254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f7d2b9e5c14'
+down_revision = '92b6e4c1a0f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tracks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('started', sa.DateTime(), nullable=False),
+    sa.Column('point_count', sa.Integer(), nullable=False),
+    sa.Column('distance', sa.Float(), nullable=False),
+    sa.Column('duration', sa.Float(), nullable=False),
+    sa.Column('elevation_gain', sa.Float(), nullable=True),
+    sa.Column('elevation_loss', sa.Float(), nullable=True),
+    sa.Column('min_latitude', sa.Float(), nullable=False),
+    sa.Column('min_longitude', sa.Float(), nullable=False),
+    sa.Column('max_latitude', sa.Float(), nullable=False),
+    sa.Column('max_longitude', sa.Float(), nullable=False),
+    sa.Column('latitudes', sa.LargeBinary(), nullable=False),
+    sa.Column('longitudes', sa.LargeBinary(), nullable=False),
+    sa.Column('times', sa.LargeBinary(), nullable=False),
+    sa.Column('elevations', sa.LargeBinary(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=True),
+    sa.Column('updated', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['runs.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('run_id')
+    )
+
+
+def downgrade():
+    op.drop_table('tracks')
@@ -0,0 +1,37 @@
+"""full-text search on runs and comments
+
+Revision ID: 4e2a9c0d5f18
+Revises: b81d4c6a93e2
+Create Date: 2026-10-18 14:26:09.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4e2a9c0d5f18'
+down_revision = 'b81d4c6a93e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # btree_gin lets runs be searched per user from a single GIN index.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    op.add_column('runs', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "to_tsvector('english', coalesce(location, '') || ' ' || coalesce(notes, ''))", persisted=True
+    )))
+    op.add_column('run_comments', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "to_tsvector('english', comment)", persisted=True
+    )))
+    op.create_index('ix_runs_user_id_search_vector', 'runs', ['user_id', 'search_vector'], postgresql_using='gin')
+    op.create_index('ix_run_comments_search_vector', 'run_comments', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_run_comments_search_vector', table_name='run_comments')
+    op.drop_index('ix_runs_user_id_search_vector', table_name='runs')
+    op.drop_column('run_comments', 'search_vector')
+    op.drop_column('runs', 'search_vector')
@@ -0,0 +1,68 @@
+"""on delete cascade and user deactivation time
+
+Revision ID: 5a9d3c7e1b48
+Revises: c8e1f4a7b2d9
+Create Date: 2026-10-18 21:08:14.522960
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9d3c7e1b48'
+down_revision = 'c8e1f4a7b2d9'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table, ON DELETE action)
+FOREIGN_KEYS = [
+    ('runs', 'user_id', 'users', 'CASCADE'),
+    ('intervals', 'run_id', 'runs', 'CASCADE'),
+    ('run_comments', 'run_id', 'runs', 'CASCADE'),
+    ('run_comments', 'user_id', 'users', 'CASCADE'),
+    ('run_summaries', 'user_id', 'users', 'CASCADE'),
+    ('personal_records', 'user_id', 'users', 'CASCADE'),
+    ('personal_records', 'run_id', 'runs', 'CASCADE'),
+    ('personal_records', 'interval_id', 'intervals', 'CASCADE'),
+    ('follows', 'follower_id', 'users', 'CASCADE'),
+    ('follows', 'followed_id', 'users', 'CASCADE'),
+    ('timeline_entries', 'user_id', 'users', 'CASCADE'),
+    ('timeline_entries', 'run_id', 'runs', 'CASCADE'),
+    ('timeline_entries', 'author_id', 'users', 'CASCADE'),
+    ('jobs', 'user_id', 'users', 'SET NULL'),
+    ('tracks', 'run_id', 'runs', 'CASCADE'),
+]
+
+
+def replace_foreign_keys(on_delete):
+    # Added NOT VALID, each constraint swap only needs a brief lock. VALIDATE
+    # then scans every table after the migration's transaction has
+    # committed, without blocking writes.
+    for table, column, referred, action in FOREIGN_KEYS:
+        name = '{}_{}_fkey'.format(table, column)
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.execute('ALTER TABLE {} ADD CONSTRAINT {} FOREIGN KEY ({}) REFERENCES {} (id){} NOT VALID'.format(
+            table, name, column, referred, ' ON DELETE ' + action if on_delete else ''
+        ))
+
+    with op.get_context().autocommit_block():
+        for table, column, referred, action in FOREIGN_KEYS:
+            op.execute('ALTER TABLE {} VALIDATE CONSTRAINT {}_{}_fkey'.format(table, table, column))
+
+
+def upgrade():
+    op.add_column('users', sa.Column('deactivated', sa.DateTime(), nullable=True))
+    # Cascades look rows up by these columns.
+    op.create_index('ix_personal_records_run_id', 'personal_records', ['run_id'], unique=False)
+    op.create_index('ix_personal_records_interval_id', 'personal_records', ['interval_id'], unique=False)
+    op.create_index('ix_timeline_entries_author_id', 'timeline_entries', ['author_id'], unique=False)
+    replace_foreign_keys(on_delete=True)
+
+
+def downgrade():
+    replace_foreign_keys(on_delete=False)
+    op.drop_index('ix_timeline_entries_author_id', table_name='timeline_entries')
+    op.drop_index('ix_personal_records_interval_id', table_name='personal_records')
+    op.drop_index('ix_personal_records_run_id', table_name='personal_records')
+    op.drop_column('users', 'deactivated')
@@ -0,0 +1,28 @@
+"""foreign key and sort indexes
+
+Revision ID: 6d0e8b4f2c57
+Revises: a3c91f2d7b10
+Create Date: 2026-10-18 10:03:17.884120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d0e8b4f2c57'
+down_revision = 'a3c91f2d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_run_comments_user_id', 'run_comments', ['user_id'])
+    op.create_index('ix_users_last_name_first_name', 'users', ['last_name', 'first_name'])
+    op.create_index('ix_users_first_name_last_name', 'users', ['first_name', 'last_name'])
+
+
+def downgrade():
+    op.drop_index('ix_users_first_name_last_name', table_name='users')
+    op.drop_index('ix_users_last_name_first_name', table_name='users')
+    op.drop_index('ix_run_comments_user_id', table_name='run_comments')
@@ -0,0 +1,54 @@
+"""follows and feed timelines
+
+Revision ID: 7c3e5a1f8d26
+Revises: 4e2a9c0d5f18
+Create Date: 2026-10-18 15:42:37.204516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e5a1f8d26'
+down_revision = '4e2a9c0d5f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('follows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('follower_id', sa.Integer(), nullable=False),
+    sa.Column('followed_id', sa.Integer(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['followed_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['follower_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('follower_id', 'followed_id')
+    )
+    op.create_index('ix_follows_followed_id', 'follows', ['followed_id'], unique=False)
+    op.create_table('timeline_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('run_date', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['run_id'], ['runs.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'run_id')
+    )
+    op.create_index('ix_timeline_entries_user_id_run_date_run_id', 'timeline_entries', ['user_id', 'run_date', 'run_id'], unique=False)
+    op.create_index('ix_timeline_entries_run_id', 'timeline_entries', ['run_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_timeline_entries_run_id', table_name='timeline_entries')
+    op.drop_index('ix_timeline_entries_user_id_run_date_run_id', table_name='timeline_entries')
+    op.drop_table('timeline_entries')
+    op.drop_index('ix_follows_followed_id', table_name='follows')
+    op.drop_table('follows')
+    op.drop_column('users', 'follower_count')
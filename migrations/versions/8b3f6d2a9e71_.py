@@ -0,0 +1,41 @@
+"""uploads
+
+Revision ID: 8b3f6d2a9e71
+Revises: 5a9d3c7e1b48
+Create Date: 2026-10-18 23:41:52.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b3f6d2a9e71'
+down_revision = '5a9d3c7e1b48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('uploads',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_uploads_user_id'), 'uploads', ['user_id'], unique=False)
+    op.create_table('upload_chunks',
+    sa.Column('upload_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['upload_id'], ['uploads.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('upload_id', 'position')
+    )
+
+
+def downgrade():
+    op.drop_table('upload_chunks')
+    op.drop_index(op.f('ix_uploads_user_id'), table_name='uploads')
+    op.drop_table('uploads')
@@ -0,0 +1,39 @@
+"""personal records
+
+Revision ID: 92b6e4c1a0f3
+Revises: d5f1a8b3e7c0
+Create Date: 2026-10-18 18:03:41.662905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '92b6e4c1a0f3'
+down_revision = 'd5f1a8b3e7c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('personal_records',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('record', sa.String(length=16), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('interval_id', sa.Integer(), nullable=True),
+    sa.Column('run_date', sa.DateTime(), nullable=False),
+    sa.Column('distance', sa.Float(), nullable=False),
+    sa.Column('duration', sa.Float(), nullable=False),
+    sa.Column('updated', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['interval_id'], ['intervals.id'], ),
+    sa.ForeignKeyConstraint(['run_id'], ['runs.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'record')
+    )
+
+
+def downgrade():
+    op.drop_table('personal_records')
@@ -0,0 +1,28 @@
+"""keyset pagination indexes
+
+Revision ID: a3c91f2d7b10
+Revises: eeb470fae984
+Create Date: 2026-10-18 09:12:41.502113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91f2d7b10'
+down_revision = 'eeb470fae984'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_runs_user_id_run_date_id', 'runs', ['user_id', 'run_date', 'id'])
+    op.create_index('ix_run_comments_run_id_created_id', 'run_comments', ['run_id', 'created', 'id'])
+    op.create_index('ix_intervals_run_id_id', 'intervals', ['run_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_intervals_run_id_id', table_name='intervals')
+    op.drop_index('ix_run_comments_run_id_created_id', table_name='run_comments')
+    op.drop_index('ix_runs_user_id_run_date_id', table_name='runs')
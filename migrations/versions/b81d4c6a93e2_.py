@@ -0,0 +1,25 @@
+"""trigram index for user search
+
+Revision ID: b81d4c6a93e2
+Revises: 0f5b7e21c9a4
+Create Date: 2026-10-18 13:41:52.660271
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81d4c6a93e2'
+down_revision = '0f5b7e21c9a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute("CREATE INDEX ix_users_full_name_trgm ON users USING gin (lower(first_name || ' ' || last_name) gin_trgm_ops)")
+
+
+def downgrade():
+    op.execute('DROP INDEX ix_users_full_name_trgm')
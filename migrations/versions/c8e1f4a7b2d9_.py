@@ -0,0 +1,41 @@
+"""run and user counters
+
+Revision ID: c8e1f4a7b2d9
+Revises: 3f7d2b9e5c14
+Create Date: 2026-10-18 20:26:51.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e1f4a7b2d9'
+down_revision = '3f7d2b9e5c14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('runs', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('runs', sa.Column('interval_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('run_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('last_run_date', sa.DateTime(), nullable=True))
+    # On large tables, skip these and run `manage.py reconcile` afterwards instead.
+    op.execute('''
+        UPDATE runs SET
+            comment_count = (SELECT count(*) FROM run_comments WHERE run_comments.run_id = runs.id),
+            interval_count = (SELECT count(*) FROM intervals WHERE intervals.run_id = runs.id)
+    ''')
+    op.execute('''
+        UPDATE users SET
+            run_count = (SELECT count(*) FROM runs WHERE runs.user_id = users.id),
+            last_run_date = (SELECT max(run_date) FROM runs WHERE runs.user_id = users.id)
+    ''')
+
+
+def downgrade():
+    op.drop_column('users', 'last_run_date')
+    op.drop_column('users', 'run_count')
+    op.drop_column('runs', 'interval_count')
+    op.drop_column('runs', 'comment_count')
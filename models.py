@@ -1,10 +1,27 @@
-from application import db, bcrypt
+from application import db, hasher
 from datetime import datetime
 from validate_email import validate_email
-from constants import ISO_FORMAT
+from sqlalchemy import Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import configure_mappers, deferred
+from sqlalchemy.schema import CreateColumn
+import serializers
+
+@compiles(CreateColumn, 'sqlite')
+def sqlite_column(element, compiler, **kw):
+    """SQLite has no generated tsvector columns, so search vectors are created as plain, always-NULL columns."""
+    column = element.element
+    if column.computed is None:
+        return compiler.visit_create_column(element, **kw)
+    return '{} TEXT'.format(compiler.preparer.format_column(column))
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_last_name_first_name', 'last_name', 'first_name'),
+        db.Index('ix_users_first_name_last_name', 'first_name', 'last_name'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(30), nullable=False)
@@ -15,6 +32,10 @@ class User(db.Model):
     updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, nullable=False, default=True)
     metric = db.Column(db.Boolean, nullable=False, default=False)
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    run_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_run_date = db.Column(db.DateTime)
+    deactivated = db.Column(db.DateTime)
 
     def validate(self):
         if self.first_name is None:
@@ -42,25 +63,10 @@ class User(db.Model):
             return 'Password must be at least 8 characters'
 
     def serialize(self, include_runs=False):
-        data =  {
-            'id': self.id,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'email': self.email,
-            'is_active': self.is_active,
-            'metric': self.metric,
-            'created': self.created.strftime(ISO_FORMAT),
-            'updated': self.updated.strftime(ISO_FORMAT)
-        }
-
-        if include_runs:
-            runs = self.runs
-            data['runs'] = [run.serialize() for run in runs]
-
-        return data
+        return serializers.Serializer().user(self, include_runs=include_runs)
 
     def hash_password(self):
-        pw_hash = bcrypt.generate_password_hash(self.password).decode('utf-8')
+        pw_hash = hasher.hash(self.password)
         self.password = pw_hash
 
     def __repr__(self):
@@ -68,10 +74,14 @@ class User(db.Model):
 
 class Run(db.Model):
     __tablename__ = 'runs'
+    __table_args__ = (
+        db.Index('ix_runs_user_id_run_date_id', 'user_id', 'run_date', 'id'),
+        db.Index('ix_runs_user_id_search_vector', 'user_id', 'search_vector', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    user = db.relationship('User', backref=db.backref('runs', lazy=True))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user = db.relationship('User', backref=db.backref('runs', lazy=True, cascade='all, delete', passive_deletes=True))
     run_date = db.Column(db.DateTime, nullable=False)
     distance = db.Column(db.Integer, nullable=False)
     duration = db.Column(db.Integer, nullable=False)
@@ -81,35 +91,16 @@ class Run(db.Model):
     run_type = db.Column(db.String(128))
     location = db.Column(db.String(128))
     notes = db.Column(db.Text)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    interval_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created = db.Column(db.DateTime, default=datetime.utcnow)
     updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_vector = deferred(db.Column(TSVECTOR, Computed(
+        "to_tsvector('english', coalesce(location, '') || ' ' || coalesce(notes, ''))", persisted=True
+    )))
 
     def serialize(self, include_comments=False, include_intervals=False):
-        data =  {
-            'id': self.id,
-            'user': self.user.serialize(),
-            'run_date': self.run_date.strftime(ISO_FORMAT),
-            'distance': self.distance,
-            'duration': self.duration,
-            'metric': self.metric,
-            'warmup': self.warmup,
-            'cooldown': self.cooldown,
-            'run_type': self.run_type,
-            'location': self.location,
-            'notes': self.notes,
-            'created': self.created.strftime(ISO_FORMAT),
-            'updated': self.updated.strftime(ISO_FORMAT)
-        }
-
-        if include_comments:
-            comments = self.run_comments
-            data['run_comments'] = [comment.serialize() for comment in comments]
-        
-        if include_intervals:
-            intervals = self.intervals
-            data['intervals'] = [interval.serialize() for interval in intervals]
-
-        return data
+        return serializers.Serializer().run(self, include_comments=include_comments, include_intervals=include_intervals)
 
     def validate(self):
         if self.run_date is None:
@@ -132,10 +123,13 @@ class Run(db.Model):
 
 class Interval(db.Model):
     __tablename__ = 'intervals'
+    __table_args__ = (
+        db.Index('ix_intervals_run_id_id', 'run_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    run_id = db.Column(db.Integer, db.ForeignKey('runs.id'), nullable=False)
-    run = db.relationship('Run', backref=db.backref('intervals', lazy=True))
+    run_id = db.Column(db.Integer, db.ForeignKey('runs.id', ondelete='CASCADE'), nullable=False)
+    run = db.relationship('Run', backref=db.backref('intervals', lazy=True, cascade='all, delete', passive_deletes=True))
     distance = db.Column(db.Integer, nullable=False)
     duration = db.Column(db.Integer, nullable=False)
     metric = db.Column(db.Boolean, nullable=False, default=False)
@@ -143,15 +137,7 @@ class Interval(db.Model):
     updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def serialize(self):
-        return {
-            'id': self.id,
-            'run': self.run.serialize(),
-            'distance': self.distance,
-            'duration': self.duration,
-            'metric': self.metric,
-            'created': self.created.strftime(ISO_FORMAT),
-            'updated': self.updated.strftime(ISO_FORMAT)
-        }
+        return serializers.Serializer().interval(self)
 
     def validate(self):
         if self.distance is None:
@@ -168,25 +154,24 @@ class Interval(db.Model):
 
 class RunComment(db.Model):
     __tablename__ = 'run_comments'
+    __table_args__ = (
+        db.Index('ix_run_comments_run_id_created_id', 'run_id', 'created', 'id'),
+        db.Index('ix_run_comments_user_id', 'user_id'),
+        db.Index('ix_run_comments_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    run_id = db.Column(db.Integer, db.ForeignKey('runs.id'), nullable=False)
-    run = db.relationship('Run', backref=db.backref('run_comments', lazy=True))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    user = db.relationship('User', backref=db.backref('run_comments', lazy=True))
+    run_id = db.Column(db.Integer, db.ForeignKey('runs.id', ondelete='CASCADE'), nullable=False)
+    run = db.relationship('Run', backref=db.backref('run_comments', lazy=True, cascade='all, delete', passive_deletes=True))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user = db.relationship('User', backref=db.backref('run_comments', lazy=True, cascade='all, delete', passive_deletes=True))
     comment = db.Column(db.Text, nullable=False)
     created = db.Column(db.DateTime, default=datetime.utcnow)
     updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_vector = deferred(db.Column(TSVECTOR, Computed("to_tsvector('english', comment)", persisted=True)))
 
     def serialize(self):
-        return {
-            'id': self.id,
-            'run': self.run.serialize(),
-            'user': self.user.serialize(),
-            'comment': self.comment,
-            'created': self.created.strftime(ISO_FORMAT),
-            'updated': self.updated.strftime(ISO_FORMAT)
-        }
+        return serializers.Serializer().comment(self)
 
     def validate(self):
         if self.comment is None or self.comment == '':
@@ -194,3 +179,153 @@ class RunComment(db.Model):
 
     def __repr__(self):
         return '<RunComment {}>'.format(self.id)
+
+class RunSummary(db.Model):
+    __tablename__ = 'run_summaries'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'period', 'period_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    period = db.Column(db.String(5), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    run_count = db.Column(db.Integer, nullable=False, default=0)
+    distance = db.Column(db.Float, nullable=False, default=0)
+    duration = db.Column(db.Integer, nullable=False, default=0)
+    warmup = db.Column(db.Float, nullable=False, default=0)
+    cooldown = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<RunSummary {} {} {}>'.format(self.user_id, self.period, self.period_start)
+
+class PersonalRecord(db.Model):
+    __tablename__ = 'personal_records'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'record'),
+        db.Index('ix_personal_records_run_id', 'run_id'),
+        db.Index('ix_personal_records_interval_id', 'interval_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    record = db.Column(db.String(16), nullable=False)
+    run_id = db.Column(db.Integer, db.ForeignKey('runs.id', ondelete='CASCADE'), nullable=False)
+    interval_id = db.Column(db.Integer, db.ForeignKey('intervals.id', ondelete='CASCADE'))
+    run_date = db.Column(db.DateTime, nullable=False)
+    distance = db.Column(db.Float, nullable=False)
+    duration = db.Column(db.Float, nullable=False)
+    updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return '<PersonalRecord {} {}>'.format(self.user_id, self.record)
+
+class Follow(db.Model):
+    __tablename__ = 'follows'
+    __table_args__ = (
+        db.UniqueConstraint('follower_id', 'followed_id'),
+        db.Index('ix_follows_followed_id', 'followed_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    follower_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    followed_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Follow {} {}>'.format(self.follower_id, self.followed_id)
+
+class TimelineEntry(db.Model):
+    __tablename__ = 'timeline_entries'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'run_id'),
+        db.Index('ix_timeline_entries_user_id_run_date_run_id', 'user_id', 'run_date', 'run_id'),
+        db.Index('ix_timeline_entries_run_id', 'run_id'),
+        db.Index('ix_timeline_entries_author_id', 'author_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    run_id = db.Column(db.Integer, db.ForeignKey('runs.id', ondelete='CASCADE'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    run_date = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return '<TimelineEntry {} {}>'.format(self.user_id, self.run_id)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+        db.Index('ix_jobs_user_id_id', 'user_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(128))
+    result = db.Column(db.JSON)
+    last_error = db.Column(db.Text)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Job {} {}>'.format(self.id, self.kind)
+
+class Upload(db.Model):
+    """A file staged for a background job, stored as UploadChunk rows (see uploads.py)."""
+    __tablename__ = 'uploads'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    size = db.Column(db.BigInteger, nullable=False, default=0)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Upload {}>'.format(self.id)
+
+class UploadChunk(db.Model):
+    __tablename__ = 'upload_chunks'
+
+    upload_id = db.Column(db.Integer, db.ForeignKey('uploads.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+class Track(db.Model):
+    """The GPS route of a run.
+
+    Points are stored as delta-encoded, zlib-compressed arrays (see tracks.py)
+    rather than one row each. The arrays are deferred, so loading a track for
+    its summary never reads them.
+    """
+    __tablename__ = 'tracks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('runs.id', ondelete='CASCADE'), unique=True, nullable=False)
+    started = db.Column(db.DateTime, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False)
+    distance = db.Column(db.Float, nullable=False)
+    duration = db.Column(db.Float, nullable=False)
+    elevation_gain = db.Column(db.Float)
+    elevation_loss = db.Column(db.Float)
+    min_latitude = db.Column(db.Float, nullable=False)
+    min_longitude = db.Column(db.Float, nullable=False)
+    max_latitude = db.Column(db.Float, nullable=False)
+    max_longitude = db.Column(db.Float, nullable=False)
+    latitudes = deferred(db.Column(db.LargeBinary, nullable=False), group='points')
+    longitudes = deferred(db.Column(db.LargeBinary, nullable=False), group='points')
+    times = deferred(db.Column(db.LargeBinary, nullable=False), group='points')
+    elevations = deferred(db.Column(db.LargeBinary), group='points')
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Track {}>'.format(self.run_id)
+
+configure_mappers()
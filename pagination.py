@@ -0,0 +1,127 @@
+import base64
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import tuple_
+from application import db
+import models
+from helpers import parse_int, parse_date
+from constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, CURSOR_DATE_FORMAT
+
+def parse_page_size(x):
+    page_size = parse_int(x) or DEFAULT_PAGE_SIZE
+    if page_size < 1:
+        page_size = DEFAULT_PAGE_SIZE
+    if page_size > MAX_PAGE_SIZE:
+        page_size = MAX_PAGE_SIZE
+    return page_size
+
+def encode_cursor(values):
+    values = [value.strftime(CURSOR_DATE_FORMAT) if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        if len(values) != len(columns):
+            return None
+        return [
+            datetime.strptime(value, CURSOR_DATE_FORMAT) if isinstance(column.type, db.DateTime) else value
+            for value, column in zip(values, columns)
+        ]
+    except:
+        return None
+
+# (columns, descending) of the unique key each list resource pages on.
+KEYSETS = {
+    'run': ([models.Run.run_date, models.Run.id], True),
+    'comment': ([models.RunComment.created, models.RunComment.id], False),
+    'interval': ([models.Interval.id], False),
+    'job': ([models.Job.id], True)
+}
+
+def keyset_query(query, columns, after=None, page_size=DEFAULT_PAGE_SIZE, descending=False):
+    """The rows of one page after the cursor values, plus one more to tell whether another page follows."""
+    if after:
+        if descending:
+            query = query.filter(tuple_(*columns) < tuple_(*after))
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*after))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return query.order_by(*order).limit(page_size + 1)
+
+def page_query(kind, query, after=None, page_size=DEFAULT_PAGE_SIZE):
+    columns, descending = KEYSETS[kind]
+    return keyset_query(query, columns, after, page_size, descending)
+
+class KeysetPage(object):
+    """One page of a query ordered on a unique key, e.g. (run_date, id).
+
+    Pages continue from the last row of the previous page with a row-value
+    comparison instead of OFFSET, so every page is a single index range scan
+    no matter how deep the client has paged.
+    """
+
+    def __init__(self, query, columns, cursor=None, page_size=DEFAULT_PAGE_SIZE, descending=False):
+        self.columns = columns
+        self.page_size = page_size
+        self.valid = True
+
+        after = None
+        if cursor:
+            after = decode_cursor(cursor, columns)
+            if after is None:
+                self.valid = False
+                self.items = []
+                self.next_cursor = None
+                return
+
+        rows = keyset_query(query, columns, after, page_size, descending).all()
+
+        self.items = rows[:page_size]
+        self.next_cursor = None
+        if len(rows) > page_size:
+            last = self.items[-1]
+            self.next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+def filter_date_range(query, column):
+    for arg in ('since', 'until'):
+        if arg not in request.args:
+            continue
+
+        value = parse_date(request.args[arg])
+        if value is None:
+            return query, 'Invalid {} date'.format(arg)
+
+        if arg == 'since':
+            query = query.filter(column >= value)
+        else:
+            query = query.filter(column <= value)
+
+    return query, None
+
+def keyset_page(query, columns, descending=False):
+    return KeysetPage(
+        query,
+        columns,
+        cursor=request.args.get('cursor'),
+        page_size=parse_page_size(request.args.get('page_size')),
+        descending=descending
+    )
+
+def kind_page(kind, query):
+    columns, descending = KEYSETS[kind]
+    return keyset_page(query, columns, descending)
+
+def run_page(query):
+    return kind_page('run', query)
+
+def comment_page(query):
+    return kind_page('comment', query)
+
+def interval_page(query):
+    return kind_page('interval', query)
+
+def job_page(query):
+    return kind_page('job', query)
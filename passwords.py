@@ -0,0 +1,83 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def check_password(pw_hash, password):
+    return bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+
+def hash_rounds(pw_hash):
+    try:
+        return int(pw_hash.split('$')[2])
+    except:
+        return None
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher(object):
+    """Runs bcrypt in a bounded process pool so logins cannot pin every request thread.
+
+    At most max_pending operations may be queued or running at once; callers
+    beyond that wait up to timeout seconds for a slot and then get
+    PasswordHasherBusy. With pool_size 0, hashing runs inline.
+    """
+
+    def __init__(self, app=None, rounds=12, pool_size=0, max_pending=0, timeout=None):
+        self.rounds = rounds
+        self.pool_size = pool_size
+        self.max_pending = max_pending or pool_size * 4
+        self.timeout = timeout
+        self.executor = None
+        self.pid = None
+        self.slots = None
+        self.lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.pool_size = app.config.get('PASSWORD_POOL_SIZE', 0)
+        self.max_pending = app.config.get('PASSWORD_POOL_MAX_PENDING') or self.pool_size * 4
+        self.timeout = app.config.get('PASSWORD_POOL_TIMEOUT')
+
+    def get_executor(self):
+        # Pools do not survive a fork, so each worker process builds its own.
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ProcessPoolExecutor(max_workers=self.pool_size)
+                self.slots = threading.BoundedSemaphore(self.max_pending)
+                self.pid = os.getpid()
+            return self.executor
+
+    def run(self, fn, *args):
+        if not self.pool_size:
+            return fn(*args)
+
+        executor = self.get_executor()
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy()
+
+        try:
+            return executor.submit(fn, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash(self, password):
+        return self.run(hash_password, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        return self.run(check_password, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        return hash_rounds(pw_hash) != self.rounds
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
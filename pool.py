@@ -0,0 +1,29 @@
+import time
+from sqlalchemy.pool import QueuePool
+from metrics import Histogram
+
+checkout_wait = Histogram()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        finally:
+            checkout_wait.observe(time.perf_counter() - start)
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'checkout_wait': checkout_wait.serialize()}
+
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow()
+        })
+
+    return stats
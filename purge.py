@@ -0,0 +1,117 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, or_
+from application import db
+import models
+import feed
+import counters
+from auth import invalidate_identity
+from responses import touch
+from constants import PURGE_BATCH_SIZE, PURGE_GRACE_DAYS
+
+logger = logging.getLogger('runnerapp.purge')
+
+users = models.User.__table__
+runs = models.Run.__table__
+comments = models.RunComment.__table__
+follows = models.Follow.__table__
+timeline = models.TimelineEntry.__table__
+
+def purgeable_users(grace_days=PURGE_GRACE_DAYS):
+    """Ids of users inactivated more than grace_days ago, or before the time was recorded."""
+    cutoff = datetime.utcnow() - timedelta(days=grace_days)
+    return [row[0] for row in db.session.execute(
+        select([users.c.id])
+            .where(users.c.is_active.is_(False))
+            .where(or_(users.c.deactivated.is_(None), users.c.deactivated < cutoff))
+            .order_by(users.c.id)
+    )]
+
+def delete_batch(table, condition, batch_size, *columns):
+    """Deletes up to batch_size rows matching condition and returns the given columns of each."""
+    ids = select([table.c.id]).where(condition).order_by(table.c.id).limit(batch_size)
+    return db.session.execute(table.delete().where(table.c.id.in_(ids)).returning(table.c.id, *columns)).fetchall()
+
+def drain(table, condition, batch_size, pause, handle=None, *columns):
+    """Deletes matching rows one batch per transaction until none are left. Returns the number deleted.
+
+    Each transaction holds row locks on at most one batch (plus whatever it
+    cascades to), and pause between batches lets replication catch up.
+    """
+    deleted = 0
+    while True:
+        rows = delete_batch(table, condition, batch_size, *columns)
+        if handle is not None and rows:
+            handle(rows)
+        db.session.commit()
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+def purge_user(user_id, batch_size=PURGE_BATCH_SIZE, pause=0.0):
+    """Removes an inactive user and everything they own, in bounded batches.
+
+    The largest fan-outs go first, so no single cascade gets big: copies of
+    their runs in followers' timelines and their own timeline, then their
+    runs (cascading to intervals, comments on them, records and tracks),
+    their comments on other runs, and their follows. The user row itself
+    goes last, cascading to what is left (summaries, records), and jobs keep
+    running with user_id set to NULL.
+    """
+    counts = {}
+    counts['timeline_entries'] = drain(timeline, timeline.c.author_id == user_id, batch_size, pause) + \
+        drain(timeline, timeline.c.user_id == user_id, batch_size, pause)
+
+    def touch_runs(rows):
+        touch(*(('run', row[0]) for row in rows))
+    counts['runs'] = drain(runs, runs.c.user_id == user_id, batch_size, pause, touch_runs)
+
+    def uncount_comments(rows):
+        per_run = {}
+        for comment_id, run_id in rows:
+            per_run[run_id] = per_run.get(run_id, 0) + 1
+        for run_id, count in per_run.items():
+            counters.change_comment_count(run_id, -count)
+    counts['comments'] = drain(comments, comments.c.user_id == user_id, batch_size, pause, uncount_comments, comments.c.run_id)
+
+    # Unfollowing one at a time keeps follower counts and fan-out in step.
+    followed = 0
+    while True:
+        followed_ids = [row[0] for row in db.session.execute(
+            select([follows.c.followed_id]).where(follows.c.follower_id == user_id).limit(batch_size)
+        )]
+        for followed_id in followed_ids:
+            feed.unfollow(user_id, followed_id)
+        db.session.commit()
+        for followed_id in followed_ids:
+            invalidate_identity(followed_id)
+        followed += len(followed_ids)
+        if len(followed_ids) < batch_size:
+            break
+        time.sleep(pause)
+    counts['follows'] = followed + drain(follows, follows.c.followed_id == user_id, batch_size, pause)
+
+    db.session.execute(users.delete().where(users.c.id == user_id))
+    touch(('user', user_id), ('user_runs', user_id))
+    db.session.commit()
+    invalidate_identity(user_id)
+
+    logger.info('Purged user %s: %s', user_id, counts)
+    return counts
+
+def purge(user_id=None, batch_size=PURGE_BATCH_SIZE, pause=0.0, grace_days=PURGE_GRACE_DAYS):
+    """Purges one inactive user, or every user past the grace period. Returns the ids purged."""
+    if user_id is not None:
+        active = db.session.query(models.User.is_active).filter(models.User.id == user_id).scalar()
+        if active is not False:
+            raise ValueError('User {} is not an inactive user'.format(user_id))
+        user_ids = [user_id]
+    else:
+        user_ids = purgeable_users(grace_days)
+        db.session.commit()
+
+    for purgeable_id in user_ids:
+        purge_user(purgeable_id, batch_size, pause)
+    return user_ids
@@ -0,0 +1,94 @@
+import json
+from sqlalchemy import desc
+from application import db
+import models
+import stats
+import records
+from serializers import run_options, comment_options, interval_options, user_options
+from pagination import page_query
+from conditional import aggregate_query, comment_aggregate_query, updated_column
+from search import user_search_query, ActivitySearch
+from feed import feed_query
+from constants import DEFAULT_PAGE_SIZE
+
+LARGE_TABLE_ROWS = 10000
+SEARCH_TERM = 'easy'
+
+def sample_ids():
+    run = models.Run.query.order_by(desc('id')).first()
+    comment = models.RunComment.query.order_by(desc('id')).first()
+    interval = models.Interval.query.order_by(desc('id')).first()
+
+    return {
+        'user_id': run.user_id if run else 1,
+        'run_id': run.id if run else 1,
+        'comment_id': comment.id if comment else 1,
+        'interval_id': interval.id if interval else 1
+    }
+
+def endpoint_queries(ids):
+    """The queries each GET endpoint issues, including the aggregates behind its validators.
+
+    Options, ordering, keyset limits and search expressions come from the
+    same helpers the controllers call, so the plans checked are the plans
+    served. Selectin loads run as separate statements and are not explained.
+    """
+    Run, RunComment, Interval, User, Job = models.Run, models.RunComment, models.Interval, models.User, models.Job
+    user_runs = Run.query.filter_by(user_id=ids['user_id'])
+    run_comments = RunComment.query.filter_by(run_id=ids['run_id'])
+    run_intervals = Interval.query.filter_by(run_id=ids['run_id'])
+    activity = ActivitySearch(ids['user_id'], SEARCH_TERM)
+
+    return [
+        ('runlist', page_query('run', user_runs.options(*run_options()))),
+        ('runlist validators', aggregate_query(user_runs, Run, updated_column(User, ids['user_id']))),
+        ('rundetail', Run.query.filter_by(id=ids['run_id']).options(*run_options(True, True))),
+        ('rundetail validators', comment_aggregate_query(ids['run_id'])),
+        ('rundetail validators intervals', aggregate_query(run_intervals, Interval)),
+        ('commentslist', page_query('comment', run_comments.options(*comment_options()))),
+        ('commentdetail', RunComment.query.filter_by(id=ids['comment_id']).options(*comment_options())),
+        ('intervallist', page_query('interval', run_intervals)),
+        ('intervaldetail', Interval.query.filter_by(id=ids['interval_id']).options(*interval_options())),
+        ('userlist', User.query.options(*user_options()).order_by('last_name').limit(DEFAULT_PAGE_SIZE)),
+        ('userlist search', User.query.filter_by(first_name='a', last_name='b').order_by('last_name').limit(DEFAULT_PAGE_SIZE)),
+        ('usersearch', user_search_query(SEARCH_TERM, limit=DEFAULT_PAGE_SIZE + 1)),
+        ('userruns', page_query('run', user_runs)),
+        ('userstats', stats.user_summaries(ids['user_id'])),
+        ('userrecords', records.user_records(ids['user_id'])),
+        ('search runs', activity.runs_query()),
+        ('search comments', activity.comments_query()),
+        ('feed', feed_query(ids['user_id'], limit=DEFAULT_PAGE_SIZE + 1)),
+        ('joblist', page_query('job', Job.query.filter_by(user_id=ids['user_id']))),
+        ('trackdetail', models.Track.query.filter_by(run_id=ids['run_id']))
+    ]
+
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    result = db.engine.execute('EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params).scalar()
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]['Plan']
+
+def seq_scans(plan):
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name']
+
+    for child in plan.get('Plans', []):
+        for relation in seq_scans(child):
+            yield relation
+
+def table_rows():
+    rows = db.engine.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+    return {relname: reltuples for relname, reltuples in rows}
+
+def check_plans(min_rows=LARGE_TABLE_ROWS):
+    """Returns (endpoint, table) pairs that plan a sequential scan on a table with at least min_rows rows."""
+    sizes = table_rows()
+    failures = []
+
+    for name, query in endpoint_queries(sample_ids()):
+        for relation in seq_scans(explain(query)):
+            if sizes.get(relation, 0) >= min_rows:
+                failures.append((name, relation))
+
+    return failures
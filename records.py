@@ -0,0 +1,180 @@
+from datetime import datetime
+from sqlalchemy import text, bindparam, or_, and_
+from sqlalchemy.dialects.postgresql import insert
+from application import db
+import models
+from helpers import to_meters
+from constants import RECORD_DISTANCES, LONGEST_RUN, METERS_PER_YARD
+
+RECORDS = tuple(name for name, meters in RECORD_DISTANCES) + (LONGEST_RUN,)
+RECORD_FIELDS = ('run_id', 'interval_id', 'run_date', 'distance', 'duration', 'updated')
+
+def user_records(user_id):
+    return models.PersonalRecord.query.filter_by(user_id=user_id).order_by(models.PersonalRecord.record)
+
+def run_effort(run):
+    return {
+        'user_id': run.user_id,
+        'run_id': run.id,
+        'interval_id': None,
+        'run_date': run.run_date,
+        'meters': to_meters(run.distance, run.metric),
+        'duration': run.duration
+    }
+
+def interval_effort(interval, run):
+    return {
+        'user_id': run.user_id,
+        'run_id': run.id,
+        'interval_id': interval.id,
+        'run_date': run.run_date,
+        'meters': to_meters(interval.distance, interval.metric),
+        'duration': interval.duration
+    }
+
+def candidates(effort):
+    """(record, distance, duration) for every record an effort can bid for.
+
+    An effort at least as long as a record distance bids at its average
+    pace, so a fast 10k also counts as a 5k. Only whole runs count towards
+    the longest run.
+    """
+    meters, duration = effort['meters'], effort['duration']
+    if meters <= 0 or duration is None:
+        return
+
+    for name, distance in RECORD_DISTANCES:
+        if meters >= distance:
+            yield name, distance, duration * distance / meters
+
+    if effort['interval_id'] is None:
+        yield LONGEST_RUN, meters, float(duration)
+
+def beats(record, distance, duration, current):
+    if record == LONGEST_RUN:
+        return distance > current['distance']
+    return duration < current['duration']
+
+def offer(efforts):
+    """Makes new or changed efforts the user's records wherever they beat the current ones.
+
+    Candidates are reduced to the best per record in Python and written with
+    one INSERT ... ON CONFLICT whose WHERE only replaces a worse record, so
+    concurrent writers cannot overwrite a better one. Runs inside the
+    caller's transaction.
+    """
+    now = datetime.utcnow()
+    best = {}
+    for effort in efforts:
+        for record, distance, duration in candidates(effort):
+            key = (effort['user_id'], record)
+            current = best.get(key)
+            if current is None or beats(record, distance, duration, current):
+                best[key] = {
+                    'user_id': effort['user_id'],
+                    'record': record,
+                    'run_id': effort['run_id'],
+                    'interval_id': effort['interval_id'],
+                    'run_date': effort['run_date'],
+                    'distance': distance,
+                    'duration': duration,
+                    'updated': now
+                }
+
+    if not best:
+        return
+
+    table = models.PersonalRecord.__table__
+    statement = insert(table).values(list(best.values()))
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_id', 'record'],
+        set_={key: statement.excluded[key] for key in RECORD_FIELDS},
+        where=or_(
+            and_(table.c.record == LONGEST_RUN, table.c.distance < statement.excluded.distance),
+            and_(table.c.record != LONGEST_RUN, table.c.duration > statement.excluded.duration)
+        )
+    )
+    db.session.execute(statement)
+
+def release(user_id, run_id=None, interval_id=None):
+    """Deletes the records held by a run (including its intervals) or by one interval.
+
+    Returns the names of the released records, which are the only ones that
+    need recompute() once the change is flushed.
+    """
+    table = models.PersonalRecord.__table__
+    statement = table.delete().where(table.c.user_id == user_id)
+    if interval_id is not None:
+        statement = statement.where(table.c.interval_id == interval_id)
+    else:
+        statement = statement.where(table.c.run_id == run_id)
+
+    return [row[0] for row in db.session.execute(statement.returning(table.c.record))]
+
+def release_intervals(user_id, run_id):
+    """Like release(), but only for records held by the run's intervals."""
+    table = models.PersonalRecord.__table__
+    statement = table.delete() \
+        .where(table.c.user_id == user_id) \
+        .where(table.c.run_id == run_id) \
+        .where(table.c.interval_id.isnot(None))
+
+    return [row[0] for row in db.session.execute(statement.returning(table.c.record))]
+
+BUCKETS = ', '.join("('{}', {!r})".format(name, meters) for name, meters in RECORD_DISTANCES + ((LONGEST_RUN, 0.0),))
+
+RECOMPUTE_SQL = text('''
+    INSERT INTO personal_records (user_id, record, run_id, interval_id, run_date, distance, duration, updated)
+    SELECT DISTINCT ON (user_id, record)
+        user_id, record, run_id, interval_id, run_date, distance, duration, now() AT TIME ZONE 'utc'
+    FROM (
+        SELECT
+            e.user_id,
+            b.record,
+            e.run_id,
+            e.interval_id,
+            e.run_date,
+            CASE WHEN b.record = :longest THEN e.meters ELSE b.meters END AS distance,
+            CASE WHEN b.record = :longest THEN e.duration ELSE e.duration * b.meters / e.meters END AS duration
+        FROM (
+            SELECT user_id, id AS run_id, NULL::integer AS interval_id, run_date,
+                distance * CASE WHEN metric THEN 1 ELSE :yard END AS meters, duration::float AS duration
+            FROM runs
+            WHERE (:user_id IS NULL OR user_id = :user_id)
+            UNION ALL
+            SELECT r.user_id, r.id, i.id, r.run_date,
+                i.distance * CASE WHEN i.metric THEN 1 ELSE :yard END, i.duration::float
+            FROM intervals i JOIN runs r ON r.id = i.run_id
+            WHERE (:user_id IS NULL OR r.user_id = :user_id)
+        ) e
+        JOIN (VALUES {buckets}) AS b (record, meters)
+            ON e.meters > 0 AND CASE WHEN b.record = :longest THEN e.interval_id IS NULL ELSE e.meters >= b.meters END
+        WHERE b.record IN :records
+    ) efforts
+    ORDER BY user_id, record, CASE WHEN record = :longest THEN -distance ELSE duration END, run_id, interval_id NULLS FIRST
+    ON CONFLICT (user_id, record) DO NOTHING
+'''.format(buckets=BUCKETS)).bindparams(bindparam('records', expanding=True))
+
+def recompute(user_id, records):
+    """Rebuilds the given records of a user from their runs and intervals."""
+    if not records:
+        return
+
+    db.session.execute(RECOMPUTE_SQL, {
+        'user_id': user_id,
+        'records': list(records),
+        'longest': LONGEST_RUN,
+        'yard': METERS_PER_YARD
+    })
+
+def backfill(user_id=None):
+    """Rebuilds every record, for one user or everyone."""
+    db.session.execute('SET LOCAL statement_timeout = 0')
+
+    held = models.PersonalRecord.query
+    if user_id is not None:
+        held = held.filter_by(user_id=user_id)
+    held.delete(synchronize_session=False)
+
+    recompute(user_id, RECORDS)
+    db.session.commit()
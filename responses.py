@@ -0,0 +1,159 @@
+import os
+import time
+from flask import request, g, current_app
+from sqlalchemy import event
+from application import app, db
+import models
+from cache import LRUCache, shared_backend, tiered_cache
+from conditional import Validators, respond
+
+response_cache = tiered_cache(app.config, 'response')
+# Versions must be exact across processes, so with a shared tier they are
+# only ever read from it. Without one, a process only sees its own writes,
+# and the cache stays off unless RESPONSE_CACHE_LOCAL says that is all of them.
+shared_versions = shared_backend(
+    app.config.get('RESPONSE_CACHE_BACKEND'), app.config.get('CACHE_URL'), app.config['VERSION_CACHE_TTL'], 'version:'
+)
+versions = shared_versions or LRUCache(app.config['VERSION_CACHE_SIZE'], app.config['VERSION_CACHE_TTL'])
+enabled = shared_versions is not None or app.config['RESPONSE_CACHE_LOCAL']
+
+lookups = {}
+
+def version_keys(obj):
+    """The version keys a write to obj bumps."""
+    if isinstance(obj, models.User):
+        return [('user', obj.id)]
+    if isinstance(obj, models.Run):
+        return [('run', obj.id), ('user_runs', obj.user_id)]
+    if isinstance(obj, (models.Interval, models.RunComment)):
+        return [('run', obj.run_id)]
+    return []
+
+def dependency_keys(model, id):
+    """The version keys a response embedding an object depends on.
+
+    Intervals and comments are always embedded under their run, whose
+    version their writes bump, so only users and runs need checking.
+    """
+    if model is models.User:
+        return [('user', id)]
+    if model is models.Run:
+        return [('run', id)]
+    return []
+
+def version_key(key):
+    return '{}:{}'.format(*key)
+
+def new_version():
+    # Bump time and a nonce: the nonce makes it unique across workers, the
+    # time lets a reader tell whether it may have read data from before it.
+    return time.time(), os.urandom(8).hex()
+
+def current_versions(keys):
+    """The version of each key, creating those that have none (or were evicted)."""
+    keys = list(keys)
+    found = versions.get_many([version_key(key) for key in keys])
+    result = {}
+    for key, version in zip(keys, found):
+        if version is None:
+            version = new_version()
+            versions.set(version_key(key), version)
+        result[key] = version
+    return result
+
+def bump(keys):
+    for key in keys:
+        versions.set(version_key(key), new_version())
+
+def touch(*keys):
+    """Marks version keys for bumping on commit, for writes that bypass the ORM."""
+    db.session.info.setdefault('version_keys', set()).update(keys)
+
+def collect_writes(session, flush_context):
+    keys = session.info.setdefault('version_keys', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        keys.update(version_keys(obj))
+
+def bump_committed(session):
+    keys = session.info.pop('version_keys', None)
+    if keys:
+        bump(keys)
+
+def discard_writes(session):
+    session.info.pop('version_keys', None)
+
+event.listen(db.session, 'after_flush', collect_writes)
+event.listen(db.session, 'after_commit', bump_committed)
+event.listen(db.session, 'after_soft_rollback', lambda session, previous_transaction: discard_writes(session))
+
+def count(endpoint, result):
+    counts = lookups.setdefault(endpoint, {'hits': 0, 'misses': 0, 'stored': 0})
+    counts[result] += 1
+
+def settle_seconds():
+    # A replica may lag a commit by about as long as writers stay sticky to the primary.
+    return current_app.config['STICKY_CACHE_TTL'] if db.replica_binds else 0
+
+def cached(keys, handler):
+    """Serves a GET from the response cache, or runs handler and caches a 200 it returns.
+
+    Entries are keyed by endpoint, path and query string, and hold the
+    version of every key the response depends on: keys plus every user and
+    run the handler serialized. A hit only counts while all of those
+    versions are current, so any committed write to them invalidates it.
+
+    A response is not stored when a dependency was bumped after the handler
+    started (less settle_seconds() for replica lag), since it may have been
+    built from data older than that version.
+    """
+    if not enabled:
+        return handler()
+
+    endpoint = request.endpoint
+    cache_key = '{}:{}?{}'.format(endpoint, request.path, request.query_string.decode('latin-1'))
+
+    entry = response_cache.get(cache_key)
+    if entry is not None:
+        dependencies = list(entry['versions'])
+        found = versions.get_many([version_key(key) for key in dependencies])
+        if found == [entry['versions'][key] for key in dependencies]:
+            count(endpoint, 'hits')
+            response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+            return respond(Validators.restore(entry['etag'], entry['last_modified']), lambda: response)
+
+    count(endpoint, 'misses')
+    started = time.time()
+    g.response_serializers = []
+    response = handler()
+    serializers = g.pop('response_serializers')
+
+    etag, weak = response.get_etag()
+    if response.status_code != 200 or etag is None or weak:
+        return response
+
+    dependencies = set(keys)
+    for serializer in serializers:
+        for model, id in serializer.serialized():
+            dependencies.update(dependency_keys(model, id))
+
+    current = current_versions(dependencies)
+    if all(bumped_at < started - settle_seconds() for bumped_at, nonce in current.values()):
+        response_cache.set(cache_key, {
+            'versions': current,
+            'body': response.get_data(),
+            'mimetype': response.mimetype,
+            'etag': etag,
+            'last_modified': response.last_modified
+        })
+        count(endpoint, 'stored')
+
+    return response
+
+def stats():
+    data = response_cache.stats()
+    data['enabled'] = enabled
+    data['endpoints'] = {
+        endpoint: dict(counts, hit_rate=counts['hits'] / (counts['hits'] + counts['misses']))
+        for endpoint, counts in lookups.items()
+    }
+    return data
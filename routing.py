@@ -0,0 +1,54 @@
+import random
+from flask import g, request, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+from cache import tiered_cache
+
+REPLICA_METHODS = {'GET', 'HEAD'}
+
+class RoutingSession(SignallingSession):
+    """Sends reads from GET requests to a replica bind and everything else to the primary.
+
+    A request stays on the primary while the session is flushing and for
+    users who committed a write in the last STICKY_CACHE_TTL seconds, so
+    clients read their own writes despite replication lag.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing:
+            bind_key = self.replica_bind_key()
+            if bind_key is not None:
+                return get_state(self.app).db.get_engine(self.app, bind=bind_key)
+
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    def replica_bind_key(self):
+        if not has_request_context() or request.method not in REPLICA_METHODS:
+            return None
+
+        state = get_state(self.app)
+        if not state.db.replica_binds:
+            return None
+
+        user_id = g.get('identity_id')
+        if user_id is not None and state.db.sticky_users.get(user_id):
+            return None
+
+        if 'replica_bind' not in g:
+            g.replica_bind = random.choice(state.db.replica_binds)
+        return g.replica_bind
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def init_app(self, app):
+        super(RoutingSQLAlchemy, self).init_app(app)
+        self.replica_binds = sorted(key for key in app.config['SQLALCHEMY_BINDS'] or {} if key.startswith('replica'))
+        self.sticky_users = tiered_cache(app.config, 'sticky')
+
+    def create_session(self, options):
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        event.listen(factory, 'after_commit', self.mark_sticky)
+        return factory
+
+    def mark_sticky(self, session):
+        if has_request_context() and g.get('identity_id') is not None:
+            self.sticky_users.set(g.identity_id, True)
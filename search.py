@@ -0,0 +1,148 @@
+from difflib import SequenceMatcher
+from sqlalchemy import func, literal_column, or_, and_, case, cast, Float
+from application import db
+import models
+from pagination import encode_cursor, decode_cursor
+from serializers import run_options, comment_options, FULL
+
+def full_name():
+    # Must match the expression of ix_users_full_name_trgm for the index to be used.
+    return func.lower(models.User.first_name.op('||')(literal_column("' '")).op('||')(models.User.last_name))
+
+def trigram_match(left, right):
+    # Custom operators are not escaped by the compiler, so double the percent
+    # sign ourselves for format/pyformat drivers such as psycopg2.
+    opstring = '%%' if db.engine.dialect.paramstyle in {'format', 'pyformat'} else '%'
+    return left.op(opstring)(right)
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def user_search_query(term, after=None, limit=None):
+    """(user, rank) rows matching a normalized search term, most relevant first. Needs pg_trgm."""
+    name = full_name()
+    pattern = escape_like(term)
+    prefix = or_(
+        name.like(pattern + '%', escape='\\'),
+        name.like('% ' + pattern + '%', escape='\\')
+    )
+    # Double precision, so the rank in a cursor compares exactly after the JSON round trip.
+    rank = (cast(func.similarity(name, term), Float) + case([(prefix, 1.0)], else_=0.0)).label('rank')
+
+    query = db.session.query(models.User, rank).filter(or_(
+        name.like('%' + pattern + '%', escape='\\'),
+        trigram_match(name, term)
+    ))
+
+    if after:
+        query = query.filter(or_(rank < after[0], and_(rank == after[0], models.User.id > after[1])))
+
+    query = query.order_by(rank.desc(), models.User.id)
+    return query.limit(limit) if limit else query
+
+class UserSearchPage(object):
+    """Users matching a name search, most relevant first.
+
+    A user matches when the search term is a substring of their full name
+    (which covers prefixes of either name) or is trigram-similar to it. Rank
+    is the trigram similarity, plus one for prefix matches. Pages are keyset
+    paginated on (rank, id).
+    """
+
+    def __init__(self, term, cursor=None, page_size=25):
+        self.term = ' '.join(term.lower().split())
+        self.page_size = page_size
+        self.valid = True
+        self.items = []
+        self.next_cursor = None
+
+        after = None
+        if cursor:
+            after = decode_cursor(cursor, [literal_column('rank', Float), models.User.id])
+            if after is None:
+                self.valid = False
+                return
+
+        if db.engine.dialect.name == 'postgresql':
+            ranked = self.search_postgres(after)
+        else:
+            ranked = self.search_python(after)
+
+        self.items = [user for user, rank in ranked[:page_size]]
+        if len(ranked) > page_size:
+            user, rank = ranked[page_size - 1]
+            self.next_cursor = encode_cursor([rank, user.id])
+
+    def search_postgres(self, after):
+        return user_search_query(self.term, after, self.page_size + 1).all()
+
+    def search_python(self, after):
+        """Fallback for databases without pg_trgm, e.g. SQLite test runs. Scans every user."""
+        ranked = []
+        for user in models.User.query:
+            name = '{} {}'.format(user.first_name, user.last_name).lower()
+            similarity = SequenceMatcher(None, name, self.term).ratio()
+            if self.term not in name and similarity < 0.3:
+                continue
+
+            prefix = name.startswith(self.term) or (' ' + self.term) in name
+            rank = similarity + (1.0 if prefix else 0.0)
+            if after and (rank > after[0] or (rank == after[0] and user.id <= after[1])):
+                continue
+
+            ranked.append((user, rank))
+
+        ranked.sort(key=lambda item: (-item[1], item[0].id))
+        return ranked[:self.page_size + 1]
+
+HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2'
+
+class ActivitySearch(object):
+    """Full-text search over a user's runs (location and notes) and the comments on them.
+
+    Matches use the generated search_vector columns and their GIN indexes;
+    snippets come from ts_headline, which Postgres only evaluates for the
+    rows that survive the LIMIT.
+    """
+
+    def __init__(self, user_id, term, limit=25, projection=FULL):
+        self.user_id = user_id
+        self.projection = projection
+        self.query = func.websearch_to_tsquery('english', term)
+        self.limit = limit
+
+    def filter_runs(self, query, run_type=None, since=None, until=None):
+        query = query.filter(models.Run.user_id == self.user_id)
+        if run_type:
+            query = query.filter(models.Run.run_type == run_type)
+        if since:
+            query = query.filter(models.Run.run_date >= since)
+        if until:
+            query = query.filter(models.Run.run_date <= until)
+        return query
+
+    def runs_query(self, **filters):
+        rank = func.ts_rank(models.Run.search_vector, self.query).label('rank')
+        document = func.coalesce(models.Run.location, '') + ' ' + func.coalesce(models.Run.notes, '')
+        snippet = func.ts_headline('english', document, self.query, HEADLINE_OPTIONS).label('snippet')
+
+        query = db.session.query(models.Run, rank, snippet) \
+            .options(*run_options(projection=self.projection)) \
+            .filter(models.Run.search_vector.op('@@')(self.query))
+        return self.filter_runs(query, **filters).order_by(rank.desc(), models.Run.id.desc()).limit(self.limit)
+
+    def comments_query(self, **filters):
+        rank = func.ts_rank(models.RunComment.search_vector, self.query).label('rank')
+        snippet = func.ts_headline('english', models.RunComment.comment, self.query, HEADLINE_OPTIONS).label('snippet')
+
+        query = db.session.query(models.RunComment, rank, snippet) \
+            .join(models.Run, models.RunComment.run_id == models.Run.id) \
+            .options(*comment_options(self.projection)) \
+            .filter(models.RunComment.search_vector.op('@@')(self.query))
+        return self.filter_runs(query, **filters).order_by(rank.desc(), models.RunComment.id.desc()).limit(self.limit)
+
+    def runs(self, **filters):
+        return self.runs_query(**filters).all()
+
+    def comments(self, **filters):
+        return self.comments_query(**filters).all()
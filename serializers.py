@@ -0,0 +1,393 @@
+import time
+from flask import request, current_app, g, has_request_context, jsonify as flask_jsonify
+from sqlalchemy.orm import joinedload, selectinload, defaultload, load_only
+from werkzeug.utils import import_string
+import models
+from helpers import format_datetime
+from instrumentation import record_serialize
+
+def orjson_dumps(data):
+    import orjson
+    return orjson.dumps(data)
+
+def ujson_dumps(data):
+    import ujson
+    return ujson.dumps(data, ensure_ascii=False)
+
+JSON_BACKENDS = {
+    'orjson': orjson_dumps,
+    'ujson': ujson_dumps
+}
+
+def init_json(app):
+    """Selects the encoder used by jsonify from the JSON_BACKEND setting.
+
+    'json' keeps Flask's own jsonify; 'orjson', 'ujson' or a dotted path to
+    a dumps(data) callable swap in a faster encoder. The backend is checked
+    here so a missing package fails at startup rather than on first request.
+    """
+    backend = app.config.get('JSON_BACKEND', 'json')
+    if backend == 'json':
+        dumps = None
+    else:
+        dumps = JSON_BACKENDS.get(backend) or import_string(backend)
+        dumps({})
+    app.extensions['json_dumps'] = dumps
+
+def jsonify(*args, **kwargs):
+    start = time.perf_counter()
+    dumps = current_app.extensions.get('json_dumps')
+    if dumps is None:
+        response = flask_jsonify(*args, **kwargs)
+    else:
+        data = args[0] if len(args) == 1 else (args or kwargs)
+        response = current_app.response_class(dumps(data), mimetype=current_app.config['JSONIFY_MIMETYPE'])
+
+    record_serialize(time.perf_counter() - start)
+    return response
+
+FIELDS = {
+    'user': ('id', 'first_name', 'last_name', 'email', 'is_active', 'metric', 'run_count', 'last_run_date', 'created', 'updated'),
+    'run': ('id', 'user', 'run_date', 'distance', 'duration', 'metric', 'warmup', 'cooldown', 'run_type', 'location', 'notes',
+            'comment_count', 'interval_count', 'created', 'updated'),
+    'interval': ('id', 'run', 'distance', 'duration', 'metric', 'created', 'updated'),
+    'comment': ('id', 'run', 'user', 'comment', 'created', 'updated')
+}
+
+# Nested objects of each type, by field name and type.
+RELATIONS = {
+    'user': {},
+    'run': {'user': 'user'},
+    'interval': {'run': 'run'},
+    'comment': {'run': 'run', 'user': 'user'}
+}
+
+# Loaded whatever fields are asked for: keys, the columns cursors are built from, and what validators read.
+LOADED_COLUMNS = {
+    'user': ('id', 'updated'),
+    'run': ('id', 'user_id', 'run_date'),
+    'interval': ('id', 'run_id'),
+    'comment': ('id', 'run_id', 'user_id', 'created')
+}
+
+DATE_FIELDS = {'run_date', 'last_run_date', 'created', 'updated'}
+INCLUDES = {'user', 'run', 'comments', 'intervals'}
+
+def parse_names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+class Projection(object):
+    """The fields and nested objects a response asks for.
+
+    fields=a,b picks the fields of the resource itself and fields[<type>]=a,b
+    those of nested users, runs, intervals or comments. include= lists the
+    nested objects to embed; the others are replaced with their ids, e.g.
+    user_id. Without either parameter responses are unchanged.
+    """
+
+    def __init__(self, fields=None, include=None):
+        self.fields = fields or {}
+        self.include = include
+        self.full = not self.fields and include is None
+
+    @classmethod
+    def from_request(cls, kind):
+        """Returns (projection, error) from the query string of a resource serializing kind."""
+        fields = {}
+        for key, value in request.args.items():
+            if key == 'fields':
+                target = kind
+            elif key.startswith('fields[') and key.endswith(']'):
+                target = key[7:-1]
+            else:
+                continue
+
+            if target not in FIELDS:
+                return None, 'Unknown type {}'.format(target)
+
+            names = parse_names(value)
+            unknown = names - set(FIELDS[target])
+            if unknown:
+                return None, 'Unknown {} field {}'.format(target, sorted(unknown)[0])
+
+            fields[target] = names | {'id'}
+
+        include = None
+        if 'include' in request.args:
+            include = parse_names(request.args['include'])
+            unknown = include - INCLUDES
+            if unknown:
+                return None, 'Unknown include {}'.format(sorted(unknown)[0])
+
+        return cls(fields, include), None
+
+    def wants(self, kind, name):
+        return kind not in self.fields or name in self.fields[kind]
+
+    def includes(self, name):
+        return self.include is None or name in self.include
+
+    def embeds(self, kind, name):
+        return self.wants(kind, name) and self.includes(name)
+
+    def columns(self, kind, path=None):
+        """load_only for the selected fields of kind, at path or on the query's own entity."""
+        if kind not in self.fields:
+            return []
+
+        names = set(LOADED_COLUMNS[kind]) | (self.fields[kind] - set(RELATIONS[kind]))
+        if path is None:
+            return [load_only(*sorted(names))]
+        return [path.load_only(*sorted(names))]
+
+FULL = Projection()
+
+def user_options(include_runs=False, projection=FULL):
+    options = projection.columns('user')
+    if include_runs:
+        options.append(selectinload(models.User.runs))
+    return options
+
+def run_options(include_comments=False, include_intervals=False, projection=FULL):
+    options = projection.columns('run')
+    if projection.embeds('run', 'user'):
+        options.append(joinedload(models.Run.user))
+        options += projection.columns('user', defaultload(models.Run.user))
+    if include_comments:
+        options.append(selectinload(models.Run.run_comments))
+        options += projection.columns('comment', defaultload(models.Run.run_comments))
+        if projection.embeds('comment', 'user'):
+            options.append(defaultload(models.Run.run_comments).joinedload(models.RunComment.user))
+            options += projection.columns('user', defaultload(models.Run.run_comments).defaultload(models.RunComment.user))
+    if include_intervals:
+        options.append(selectinload(models.Run.intervals))
+        options += projection.columns('interval', defaultload(models.Run.intervals))
+    return options
+
+def interval_options(projection=FULL):
+    options = projection.columns('interval')
+    if projection.embeds('interval', 'run'):
+        options.append(joinedload(models.Interval.run))
+        options += projection.columns('run', defaultload(models.Interval.run))
+        if projection.embeds('run', 'user'):
+            options.append(defaultload(models.Interval.run).joinedload(models.Run.user))
+            options += projection.columns('user', defaultload(models.Interval.run).defaultload(models.Run.user))
+    return options
+
+def comment_options(projection=FULL):
+    options = projection.columns('comment')
+    if projection.embeds('comment', 'user'):
+        options.append(joinedload(models.RunComment.user))
+        options += projection.columns('user', defaultload(models.RunComment.user))
+    if projection.embeds('comment', 'run'):
+        options.append(joinedload(models.RunComment.run))
+        options += projection.columns('run', defaultload(models.RunComment.run))
+        if projection.embeds('run', 'user'):
+            options.append(defaultload(models.RunComment.run).joinedload(models.Run.user))
+            options += projection.columns('user', defaultload(models.RunComment.run).defaultload(models.Run.user))
+    return options
+
+class Serializer(object):
+    """Serializes models for a single response.
+
+    Nested objects are built once per response and the same dict is reused
+    every time they appear again, e.g. the run and user embedded in each
+    comment of a run.
+    """
+
+    def __init__(self, projection=FULL):
+        self.projection = projection
+        self.memo = {}
+        self.depth = 0
+        # Lets responses.cached() see what a cached response embedded.
+        if has_request_context() and 'response_serializers' in g:
+            g.response_serializers.append(self)
+
+    def serialized(self):
+        """(model class, id) of every object serialized so far."""
+        return list(self.memo)
+
+    def builder(self, kind):
+        if self.projection.full:
+            return getattr(self, 'build_' + kind)
+        return lambda obj: self.project(kind, obj)
+
+    def project(self, kind, obj):
+        """Like build_<kind>, but only reads the fields the projection selects."""
+        data = {}
+        relations = RELATIONS[kind]
+        for name in FIELDS[kind]:
+            if not self.projection.wants(kind, name):
+                continue
+
+            if name in relations:
+                if self.projection.includes(name):
+                    data[name] = getattr(self, relations[name])(getattr(obj, name))
+                else:
+                    data[name + '_id'] = getattr(obj, name + '_id')
+            elif name in DATE_FIELDS:
+                value = getattr(obj, name)
+                data[name] = format_datetime(value) if value is not None else None
+            else:
+                data[name] = getattr(obj, name)
+        return data
+
+    def memoize(self, obj, build):
+        key = (obj.__class__, obj.id)
+        data = self.memo.get(key)
+        if data is None:
+            # Only the outermost build is timed, so nested objects are not counted twice.
+            start = time.perf_counter() if self.depth == 0 else None
+            self.depth += 1
+            try:
+                data = build(obj)
+            finally:
+                self.depth -= 1
+            if start is not None:
+                record_serialize(time.perf_counter() - start)
+            self.memo[key] = data
+        return data
+
+    def user(self, user, include_runs=False):
+        data = self.memoize(user, self.builder('user'))
+
+        if include_runs:
+            data = dict(data)
+            data['runs'] = [self.run(run) for run in user.runs]
+
+        return data
+
+    def run(self, run, include_comments=False, include_intervals=False):
+        data = self.memoize(run, self.builder('run'))
+
+        if include_comments or include_intervals:
+            data = dict(data)
+
+        if include_comments:
+            data['run_comments'] = [self.comment(comment) for comment in run.run_comments]
+
+        if include_intervals:
+            data['intervals'] = [self.interval(interval) for interval in run.intervals]
+
+        return data
+
+    def interval(self, interval):
+        return self.memoize(interval, self.builder('interval'))
+
+    def comment(self, comment):
+        return self.memoize(comment, self.builder('comment'))
+
+    def compact_interval(self, interval):
+        # Without the embedded run, for responses that already name it.
+        return {
+            'id': interval.id,
+            'distance': interval.distance,
+            'duration': interval.duration,
+            'metric': interval.metric
+        }
+
+    def build_user(self, user):
+        return {
+            'id': user.id,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'email': user.email,
+            'is_active': user.is_active,
+            'metric': user.metric,
+            'run_count': user.run_count,
+            'last_run_date': format_datetime(user.last_run_date) if user.last_run_date else None,
+            'created': format_datetime(user.created),
+            'updated': format_datetime(user.updated)
+        }
+
+    def build_run(self, run):
+        return {
+            'id': run.id,
+            'user': self.user(run.user),
+            'run_date': format_datetime(run.run_date),
+            'distance': run.distance,
+            'duration': run.duration,
+            'metric': run.metric,
+            'warmup': run.warmup,
+            'cooldown': run.cooldown,
+            'run_type': run.run_type,
+            'location': run.location,
+            'notes': run.notes,
+            'comment_count': run.comment_count,
+            'interval_count': run.interval_count,
+            'created': format_datetime(run.created),
+            'updated': format_datetime(run.updated)
+        }
+
+    def build_interval(self, interval):
+        return {
+            'id': interval.id,
+            'run': self.run(interval.run),
+            'distance': interval.distance,
+            'duration': interval.duration,
+            'metric': interval.metric,
+            'created': format_datetime(interval.created),
+            'updated': format_datetime(interval.updated)
+        }
+
+    def build_comment(self, comment):
+        return {
+            'id': comment.id,
+            'run': self.run(comment.run),
+            'user': self.user(comment.user),
+            'comment': comment.comment,
+            'created': format_datetime(comment.created),
+            'updated': format_datetime(comment.updated)
+        }
+
+    def job(self, job):
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'attempts': job.attempts,
+            'max_attempts': job.max_attempts,
+            'run_at': format_datetime(job.run_at),
+            'result': job.result,
+            'error': job.last_error.strip().splitlines()[-1] if job.last_error else None,
+            'created': format_datetime(job.created),
+            'updated': format_datetime(job.updated)
+        }
+
+    def record(self, record):
+        return {
+            'record': record.record,
+            'distance': record.distance,
+            'duration': record.duration,
+            'pace': record.duration * 1000 / record.distance,
+            'run_id': record.run_id,
+            'interval_id': record.interval_id,
+            'run_date': format_datetime(record.run_date),
+            'updated': format_datetime(record.updated)
+        }
+
+    def track(self, track):
+        return {
+            'run_id': track.run_id,
+            'started': format_datetime(track.started),
+            'points': track.point_count,
+            'distance': track.distance,
+            'duration': track.duration,
+            'pace': track.duration * 1000 / track.distance if track.distance else None,
+            'elevation_gain': track.elevation_gain,
+            'elevation_loss': track.elevation_loss,
+            'bounds': [[track.min_latitude, track.min_longitude], [track.max_latitude, track.max_longitude]],
+            'updated': format_datetime(track.updated)
+        }
+
+    def summary(self, summary):
+        return {
+            'period': summary.period,
+            'period_start': summary.period_start.isoformat(),
+            'run_count': summary.run_count,
+            'distance': summary.distance,
+            'duration': summary.duration,
+            'warmup': summary.warmup,
+            'cooldown': summary.cooldown,
+            'pace': summary.duration * 1000 / summary.distance if summary.distance else None
+        }
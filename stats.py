@@ -0,0 +1,105 @@
+from datetime import timedelta
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from application import db
+import models
+from helpers import to_meters
+from constants import METERS_PER_YARD, SUMMARY_PERIODS
+
+def user_summaries(user_id):
+    """A user's non-empty summary rows, latest period first."""
+    return models.RunSummary.query \
+        .filter_by(user_id=user_id) \
+        .filter(models.RunSummary.run_count > 0) \
+        .order_by(models.RunSummary.period_start.desc())
+
+def period_start(period, run_date):
+    day = run_date.date()
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+def contribution(run):
+    """A run's share of its summary rows, with distances normalized to meters."""
+    return {
+        'user_id': run.user_id,
+        'run_date': run.run_date,
+        'distance': to_meters(run.distance, run.metric),
+        'duration': run.duration or 0,
+        'warmup': to_meters(run.warmup, run.metric),
+        'cooldown': to_meters(run.cooldown, run.metric)
+    }
+
+SUMMARY_FIELDS = ('distance', 'duration', 'warmup', 'cooldown')
+
+def apply_contributions(contributions, sign):
+    """Adds (sign=1) or removes (sign=-1) runs from their week, month and year summaries.
+
+    Contributions are summed per summary row first and written with a single
+    INSERT ... ON CONFLICT, so concurrent writers increment the same row
+    atomically. Runs inside the caller's transaction.
+    """
+    buckets = {}
+    for data in contributions:
+        for period in SUMMARY_PERIODS:
+            key = (data['user_id'], period, period_start(period, data['run_date']))
+            bucket = buckets.setdefault(key, dict.fromkeys(('run_count',) + SUMMARY_FIELDS, 0))
+            bucket['run_count'] += sign
+            for field in SUMMARY_FIELDS:
+                bucket[field] += sign * data[field]
+
+    if not buckets:
+        return
+
+    table = models.RunSummary.__table__
+    statement = insert(table).values([
+        dict(values, user_id=user_id, period=period, period_start=start)
+        for (user_id, period, start), values in buckets.items()
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_id', 'period', 'period_start'],
+        set_={key: table.c[key] + statement.excluded[key] for key in ('run_count',) + SUMMARY_FIELDS}
+    )
+    db.session.execute(statement)
+
+def apply_contribution(data, sign):
+    apply_contributions([data], sign)
+
+def record_run(run):
+    apply_contribution(contribution(run), 1)
+
+def unrecord_run(run):
+    apply_contribution(contribution(run), -1)
+
+BACKFILL_SQL = text('''
+    INSERT INTO run_summaries (user_id, period, period_start, run_count, distance, duration, warmup, cooldown)
+    SELECT
+        user_id,
+        :period,
+        date_trunc(:period, run_date)::date,
+        count(*),
+        sum(distance * CASE WHEN metric THEN 1 ELSE :yard END),
+        sum(duration),
+        sum(coalesce(warmup, 0) * CASE WHEN metric THEN 1 ELSE :yard END),
+        sum(coalesce(cooldown, 0) * CASE WHEN metric THEN 1 ELSE :yard END)
+    FROM runs
+    WHERE (:user_id IS NULL OR user_id = :user_id)
+    GROUP BY user_id, date_trunc(:period, run_date)
+''')
+
+def backfill(user_id=None):
+    """Rebuilds summary rows from the runs table, for one user or everyone."""
+    # A full rebuild can outlast the request statement_timeout.
+    db.session.execute('SET LOCAL statement_timeout = 0')
+
+    summaries = models.RunSummary.query
+    if user_id is not None:
+        summaries = summaries.filter_by(user_id=user_id)
+    summaries.delete(synchronize_session=False)
+
+    for period in SUMMARY_PERIODS:
+        db.session.execute(BACKFILL_SQL, {'period': period, 'yard': METERS_PER_YARD, 'user_id': user_id})
+
+    db.session.commit()
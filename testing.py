@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from application import db
+
+# Maximum number of SQL statements each GET endpoint may issue, including the
+# identity lookup done by @jwt_required().
+QUERY_BUDGETS = {
+    'runlist': 3,
+    'rundetail': 7,
+    'commentslist': 4,
+    'commentdetail': 2,
+    'intervallist': 4,
+    'intervaldetail': 2,
+    'userlist': 2,
+    'userdetail': 2,
+    'userruns': 4,
+    'userstats': 4,
+    'userrecords': 3,
+    'feed': 2,
+    'joblist': 2,
+    'jobdetail': 2,
+    'trackdetail': 4,
+    'trackpolyline': 4
+}
+
+class QueryCounter(object):
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+@contextmanager
+def count_queries(engine=None):
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    with count_queries(engine) as counter:
+        yield counter
+
+    if counter.count > limit:
+        raise AssertionError('Expected at most {} queries, got {}:\n{}'.format(
+            limit, counter.count, '\n'.join(counter.statements)
+        ))
+
+def assert_query_budget(endpoint, engine=None):
+    return assert_max_queries(QUERY_BUDGETS[endpoint], engine)
@@ -0,0 +1,29 @@
+"""Tests that need a database. Point DATABASE_URL at a scratch PostgreSQL database:
+
+    DATABASE_URL=postgresql://localhost/runnerapp_test python -m pytest tests
+
+The schema is built by running the migrations, which also create the
+extensions it needs (pg_trgm, btree_gin). Seeded rows all use
+@bench.example.com addresses and are removed afterwards.
+"""
+import os
+import unittest
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault('APP_SETTINGS', 'config.TestingConfig')
+os.environ.setdefault('SECRET_KEY', 'testing')
+
+if not os.environ.get('DATABASE_URL'):
+    raise unittest.SkipTest('Set DATABASE_URL to a test database to run these tests')
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+def create_schema():
+    """Migrates the test database to head, as a deployment would."""
+    from flask_migrate import Migrate, upgrade
+    from application import app, db
+
+    Migrate(app, db, directory=MIGRATIONS)
+    with app.app_context():
+        upgrade()
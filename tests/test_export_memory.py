@@ -0,0 +1,37 @@
+import unittest
+from tests import create_schema
+from application import app, db
+import models
+from benchmarks.export_memory import seed_user, remove_user, export_peak
+
+SMALL, LARGE = 500, 5000
+TOLERANCE = 10e6
+
+class ExportMemoryTest(unittest.TestCase):
+    """Peak RSS of a streamed export stays flat as the history grows tenfold."""
+
+    @classmethod
+    def setUpClass(cls):
+        create_schema()
+        with app.app_context():
+            cls.user_ids = {size: seed_user(size, intervals=2).id for size in (SMALL, LARGE)}
+            db.session.remove()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            for user_id in cls.user_ids.values():
+                remove_user(models.User.query.get(user_id))
+            db.session.remove()
+
+    def assert_flat(self, export_format, compress):
+        small, small_bytes = export_peak(self.user_ids[SMALL], export_format, compress)
+        large, large_bytes = export_peak(self.user_ids[LARGE], export_format, compress)
+        self.assertGreater(large_bytes, small_bytes * 5)
+        self.assertLess(large - small, TOLERANCE, 'Peak RSS grew from {:.1f} MB to {:.1f} MB'.format(small / 1e6, large / 1e6))
+
+    def test_ndjson(self):
+        self.assert_flat('ndjson', False)
+
+    def test_csv_gzip(self):
+        self.assert_flat('csv', True)
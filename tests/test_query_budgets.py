@@ -0,0 +1,46 @@
+import unittest
+from tests import create_schema
+from application import app, db, jwt
+from testing import QUERY_BUDGETS, assert_query_budget
+from benchmarks import seed
+from benchmarks.api import sample_ids, endpoints
+
+class QueryBudgetTest(unittest.TestCase):
+    """Every budgeted GET endpoint, against seeded data, within its QUERY_BUDGETS entry.
+
+    Each user has several runs with intervals, comments, a track and
+    followers, so a relationship loaded per row shows up as extra queries.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        create_schema()
+        with app.app_context():
+            seed.clean()
+            seed.seed(users=5, runs=10, intervals=3, comments=2, follows=2, tracks_per_user=1)
+            user, ids = sample_ids()
+            cls.urls = endpoints(ids)
+            cls.headers = {'Authorization': 'Bearer {}'.format(jwt.jwt_encode_callback(user).decode('utf-8'))}
+            db.session.remove()
+        cls.client = app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            seed.clean()
+            db.session.remove()
+
+    def test_budgets_match_routes(self):
+        routed = {endpoint for endpoint, url in self.urls}
+        self.assertEqual(set(QUERY_BUDGETS) - routed, set())
+
+    def test_query_budgets(self):
+        for endpoint, url in self.urls:
+            if endpoint not in QUERY_BUDGETS:
+                continue
+
+            with self.subTest(endpoint=endpoint), app.app_context():
+                with assert_query_budget(endpoint):
+                    response = self.client.get(url, headers=self.headers)
+                    response.get_data()
+                self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
@@ -0,0 +1,282 @@
+import zlib
+from array import array
+from datetime import datetime, timezone
+import numpy as np
+from dateutil.parser import isoparse
+from defusedxml import ElementTree
+from constants import MAX_TRACK_POINTS, METERS_PER_YARD
+
+EARTH_RADIUS = 6371008.8
+SEMICIRCLES = 180.0 / 2 ** 31
+
+# Fixed-point scales the arrays are stored at: 1e-6 degrees (about 11 cm),
+# milliseconds and decimeters.
+COORDINATE_SCALE = 1e6
+TIME_SCALE = 1e3
+ELEVATION_SCALE = 10.0
+
+ELEVATION_SMOOTHING = 5
+
+class TrackError(Exception):
+    pass
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def child_text(element, name):
+    for child in element:
+        if local_name(child.tag) == name:
+            return child.text
+    return None
+
+def timestamp(value):
+    moment = isoparse(value.strip())
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+def xml_points(stream, point_tag, read):
+    """Streams (latitude, longitude, time, elevation) from an XML track, clearing each element once read.
+
+    Uploads are untrusted, so defusedxml's parser rejects entity declarations
+    and external references with a ValueError.
+    """
+    for _, element in ElementTree.iterparse(stream):
+        if local_name(element.tag) == point_tag:
+            point = read(element)
+            element.clear()
+            if point is not None:
+                yield point
+
+def read_gpx_point(element):
+    time = child_text(element, 'time')
+    if time is None or element.get('lat') is None or element.get('lon') is None:
+        return None
+    elevation = child_text(element, 'ele')
+    return float(element.get('lat')), float(element.get('lon')), timestamp(time), float(elevation) if elevation else None
+
+def read_tcx_point(element):
+    time = child_text(element, 'Time')
+    position = next((child for child in element if local_name(child.tag) == 'Position'), None)
+    if time is None or position is None:
+        return None
+    elevation = child_text(element, 'AltitudeMeters')
+    return (float(child_text(position, 'LatitudeDegrees')), float(child_text(position, 'LongitudeDegrees')),
+            timestamp(time), float(elevation) if elevation else None)
+
+def gpx_points(stream):
+    return xml_points(stream, 'trkpt', read_gpx_point)
+
+def tcx_points(stream):
+    return xml_points(stream, 'Trackpoint', read_tcx_point)
+
+def fit_points(stream):
+    import fitparse
+    for message in fitparse.FitFile(stream).get_messages('record'):
+        values = message.get_values()
+        if values.get('position_lat') is None or values.get('position_long') is None or values.get('timestamp') is None:
+            continue
+        elevation = values.get('enhanced_altitude', values.get('altitude'))
+        yield (values['position_lat'] * SEMICIRCLES, values['position_long'] * SEMICIRCLES,
+               (values['timestamp'] - datetime(1970, 1, 1)).total_seconds(), elevation)
+
+TRACK_FORMATS = {
+    'gpx': gpx_points,
+    'tcx': tcx_points,
+    'fit': fit_points
+}
+
+def detect_format(name, mimetype):
+    name = (name or '').lower()
+    if name.endswith('.gpx') or mimetype == 'application/gpx+xml':
+        return 'gpx'
+    if name.endswith('.tcx') or mimetype == 'application/vnd.garmin.tcx+xml':
+        return 'tcx'
+    if name.endswith('.fit') or mimetype == 'application/vnd.ant.fit':
+        return 'fit'
+
+def read_points(points):
+    """Collects streamed points into arrays, sorted by time.
+
+    Points go into typed arrays as they are parsed, so memory stays at a few
+    bytes per value however large the upload. Elevation is NaN where missing.
+    """
+    columns = [array('d'), array('d'), array('d'), array('d')]
+    try:
+        for latitude, longitude, time, elevation in points:
+            if len(columns[0]) >= MAX_TRACK_POINTS:
+                raise TrackError('Track has more than {} points'.format(MAX_TRACK_POINTS))
+            columns[0].append(latitude)
+            columns[1].append(longitude)
+            columns[2].append(time)
+            columns[3].append(float('nan') if elevation is None else elevation)
+    except (ElementTree.ParseError, ValueError, TypeError):
+        raise TrackError('Unable to parse track')
+
+    if len(columns[0]) < 2:
+        raise TrackError('Track must have at least 2 points with a position and time')
+
+    latitudes, longitudes, times, elevations = (np.frombuffer(column, dtype=np.float64) for column in columns)
+    if (np.abs(latitudes) > 90).any() or (np.abs(longitudes) > 180).any():
+        raise TrackError('Invalid coordinates')
+
+    order = np.argsort(times, kind='stable')
+    return latitudes[order], longitudes[order], times[order], elevations[order]
+
+def encode(values, scale):
+    """Fixed-point deltas, as little-endian int32, compressed.
+
+    Consecutive GPS points differ by a handful of units at these scales, so
+    the deltas are small and highly repetitive and zlib packs them tightly.
+    """
+    deltas = np.diff(np.round(values * scale).astype(np.int64), prepend=0)
+    if deltas.size and (deltas.min() < np.iinfo(np.int32).min or deltas.max() > np.iinfo(np.int32).max):
+        raise TrackError('Track values out of range')
+    return zlib.compress(deltas.astype('<i4').tobytes())
+
+def decode(data, scale):
+    return np.cumsum(np.frombuffer(zlib.decompress(data), dtype='<i4'), dtype=np.int64) / scale
+
+def segment_distances(latitudes, longitudes):
+    """Haversine distance in meters between consecutive points."""
+    latitudes, longitudes = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin(np.diff(latitudes) / 2) ** 2 + \
+        np.cos(latitudes[:-1]) * np.cos(latitudes[1:]) * np.sin(np.diff(longitudes) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def cumulative_distances(latitudes, longitudes):
+    return np.concatenate(([0.0], np.cumsum(segment_distances(latitudes, longitudes))))
+
+def elevation_change(elevations):
+    """Total (gain, loss) in meters, or (None, None) without elevation data.
+
+    A moving average over ELEVATION_SMOOTHING points first, so barometer and
+    GPS noise does not add up to phantom climbing.
+    """
+    elevations = elevations[~np.isnan(elevations)]
+    if elevations.size < 2:
+        return None, None
+
+    window = min(ELEVATION_SMOOTHING, elevations.size)
+    smoothed = np.convolve(elevations, np.ones(window) / window, mode='valid')
+    changes = np.diff(smoothed)
+    return float(changes[changes > 0].sum()), float(-changes[changes < 0].sum())
+
+def fill_gaps(values):
+    missing = np.isnan(values)
+    indexes = np.where(missing, 0, np.arange(values.size))
+    np.maximum.accumulate(indexes, out=indexes)
+    filled = values[indexes]
+    # Leading gaps have nothing before them, so take the first reading.
+    filled[np.isnan(filled)] = values[~missing][0]
+    return filled
+
+def build_track(track, points):
+    """Fills a models.Track from parsed points."""
+    latitudes, longitudes, times, elevations = read_points(points)
+    gain, loss = elevation_change(elevations)
+    has_elevation = not np.isnan(elevations).all()
+
+    track.started = datetime.utcfromtimestamp(times[0])
+    track.point_count = int(latitudes.size)
+    track.distance = float(segment_distances(latitudes, longitudes).sum())
+    track.duration = float(times[-1] - times[0])
+    track.elevation_gain = gain
+    track.elevation_loss = loss
+    track.min_latitude, track.max_latitude = float(latitudes.min()), float(latitudes.max())
+    track.min_longitude, track.max_longitude = float(longitudes.min()), float(longitudes.max())
+    track.latitudes = encode(latitudes, COORDINATE_SCALE)
+    track.longitudes = encode(longitudes, COORDINATE_SCALE)
+    track.times = encode(times - times[0], TIME_SCALE)
+    # Missing readings are filled from the previous one so the deltas stay valid.
+    track.elevations = encode(fill_gaps(elevations), ELEVATION_SCALE) if has_elevation else None
+    return track
+
+def splits(track, metric=True):
+    """Time, pace and elevation change for each kilometer or mile of a track.
+
+    Split boundaries rarely fall on a recorded point, so their times and
+    elevations are interpolated along the cumulative distance.
+    """
+    latitudes, longitudes = decode(track.latitudes, COORDINATE_SCALE), decode(track.longitudes, COORDINATE_SCALE)
+    times = decode(track.times, TIME_SCALE)
+    distances = cumulative_distances(latitudes, longitudes)
+
+    unit = 1000.0 if metric else METERS_PER_YARD * 1760
+    marks = np.append(np.arange(unit, distances[-1], unit), distances[-1])
+    marks = np.concatenate(([0.0], marks[marks > 0]))
+    lengths = np.diff(marks)
+    durations = np.diff(np.interp(marks, distances, times))
+
+    rises = [None] * lengths.size
+    if track.elevations is not None:
+        rises = np.diff(np.interp(marks, distances, decode(track.elevations, ELEVATION_SCALE))).tolist()
+
+    return [
+        {
+            'split': i + 1,
+            'distance': float(length),
+            'duration': float(duration),
+            'pace': float(duration * unit / length),
+            'elevation_change': rise
+        }
+        for i, (length, duration, rise) in enumerate(zip(lengths, durations, rises))
+    ]
+
+def simplify(x, y, tolerance):
+    """Indexes of the points Douglas-Peucker keeps at tolerance meters.
+
+    Iterative rather than recursive so long tracks cannot hit the recursion
+    limit. Each step measures every point of a segment at once.
+    """
+    keep = np.zeros(x.size, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, x.size - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            offsets = np.hypot(px, py)
+        else:
+            offsets = np.abs(dx * py - dy * px) / length
+
+        farthest = int(np.argmax(offsets))
+        if offsets[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return np.flatnonzero(keep)
+
+def encode_polyline(latitudes, longitudes):
+    """Encoded polyline (precision 5), the format map libraries decode directly."""
+    values = np.round(np.column_stack((latitudes, longitudes)) * 1e5).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=[[0, 0]]).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chunks = []
+    for value in zigzag.tolist():
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+def polyline(track, tolerance):
+    """The track simplified to tolerance meters, as (encoded polyline, point count)."""
+    latitudes, longitudes = decode(track.latitudes, COORDINATE_SCALE), decode(track.longitudes, COORDINATE_SCALE)
+
+    # Equirectangular projection around the track's mean latitude: accurate
+    # to well under a meter over the extent of a run.
+    scale = np.radians(1) * EARTH_RADIUS
+    x = longitudes * scale * np.cos(np.radians(latitudes.mean()))
+    y = latitudes * scale
+
+    kept = simplify(x, y, tolerance)
+    return encode_polyline(latitudes[kept], longitudes[kept]), int(kept.size)
@@ -0,0 +1,76 @@
+import codecs
+import io
+from sqlalchemy import select
+from application import db
+import models
+from constants import UPLOAD_CHUNK_SIZE
+
+uploads = models.Upload.__table__
+chunks = models.UploadChunk.__table__
+
+def stage(stream, user_id, encoding=None):
+    """Copies a stream into a new Upload in the caller's transaction, one chunk in memory at a time.
+
+    With an encoding, the data is checked as it is copied and a
+    UnicodeDecodeError raised for invalid input.
+    """
+    upload = models.Upload(user_id=user_id, size=0)
+    db.session.add(upload)
+    db.session.flush()
+
+    decoder = codecs.getincrementaldecoder(encoding)() if encoding else None
+    position = 0
+    while True:
+        data = stream.read(UPLOAD_CHUNK_SIZE)
+        if not data:
+            break
+        if decoder:
+            decoder.decode(data)
+        db.session.execute(chunks.insert().values(upload_id=upload.id, position=position, data=data))
+        upload.size += len(data)
+        position += 1
+
+    if decoder:
+        decoder.decode(b'', final=True)
+    return upload
+
+def read_chunks(upload_id):
+    # One primary key lookup per chunk rather than a cursor, so readers may
+    # commit between reads, as imports do after every batch.
+    position = 0
+    while True:
+        data = db.session.execute(
+            select([chunks.c.data]).where(chunks.c.upload_id == upload_id).where(chunks.c.position == position)
+        ).scalar()
+        if data is None:
+            return
+        yield bytes(data)
+        position += 1
+
+class UploadReader(io.RawIOBase):
+    def __init__(self, upload_id):
+        self.chunks = read_chunks(upload_id)
+        self.chunk = memoryview(b'')
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.offset >= len(self.chunk):
+            data = next(self.chunks, None)
+            if data is None:
+                return 0
+            self.chunk, self.offset = memoryview(data), 0
+
+        size = min(len(buffer), len(self.chunk) - self.offset)
+        buffer[:size] = self.chunk[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+def open_upload(upload_id):
+    """A binary stream over a staged upload that holds one chunk in memory."""
+    return io.BufferedReader(UploadReader(upload_id))
+
+def delete(upload_id):
+    db.session.execute(uploads.delete().where(uploads.c.id == upload_id))